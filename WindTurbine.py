@@ -1,7 +1,1109 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import datetime as dt
 import pandas as pd
 
+import WindTurbine_cache as wtc
+import WindTurbine_profile as wtp
+import WindTurbine_store as wts
+
+# The SCADA data is logged every 10 minutes
+SAMPLE_PERIOD = pd.Timedelta('10min')
+
+
+def window_label(window):
+    """
+    Returns the column prefix used for a rolling window, e.g. '2hr' or '30min'
+    """
+    window = pd.Timedelta(window)
+    if window % pd.Timedelta('1h') == pd.Timedelta(0):
+        return str(window // pd.Timedelta('1h')) + 'hr'
+    return str(window // pd.Timedelta('1min')) + 'min'
+
+
+def window_list(windows):
+    """
+    Returns windows, a str, pandas.Timedelta or a sequence of these, as a
+    list of pandas.Timedelta. Raises ValueError for a window that is not a
+    time length
+    """
+    if isinstance(windows, (str, pd.Timedelta, dt.timedelta)):
+        windows = (windows,)
+    return [pd.Timedelta(window) for window in windows]
+
+
+def window_var(values, start, end, rows, cols, chunk=2**20):
+    """
+    Returns the ddof=1 variance of values[start[r]:end[r], c], ignoring NaN,
+    for each pair (r, c) of rows and cols, with two passes over the window.
+    A window of equal values has a variance of exactly 0
+    """
+    var = np.empty(len(rows))
+    if not len(rows):
+        return var
+    offsets = np.arange((end[rows] - start[rows]).max())
+    step = max(chunk // len(offsets), 1)
+    for i in range(0, len(rows), step):
+        r, c = rows[i:i + step], cols[i:i + step]
+        positions = start[r][:, np.newaxis] + offsets
+        x = values[np.minimum(positions, len(values) - 1), c[:, np.newaxis]]
+        x[positions >= end[r][:, np.newaxis]] = np.nan
+        with np.errstate(all='ignore'):
+            mean = np.nanmean(x, axis=1)
+            var[i:i + step] = (np.nansum((x - mean[:, np.newaxis]) ** 2, axis=1)
+                               / (np.count_nonzero(~np.isnan(x), axis=1) - 1))
+            var[i:i + step][np.nanmax(x, axis=1) == np.nanmin(x, axis=1)] = 0
+    return var
+
+
+def rolling_mean_std(data, windows=('2hr',), sample_period=SAMPLE_PERIOD):
+    """
+    Calculates the trailing mean and standard deviation of every column of
+    data for one or more window lengths in a single pass.
+
+    The window ending at time t covers data.loc[t-window:t], both ends
+    included. Cumulative sums of the values, squared values and non-NaN
+    counts are built once, and every window is then a difference of two
+    rows of the cumulative sums, so extra window lengths only cost a
+    searchsorted and a subtraction. The difference of two large sums loses
+    the variance of a nearly constant window to rounding, so the windows
+    whose variance is within the rounding error of the sums are recomputed
+    directly, and a constant window has a standard deviation of exactly 0.
+
+    On a TimeGrid the window edges are slot offsets, and nothing is
+    searched.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or TimeGrid
+        Numeric data with a sorted DatetimeIndex, or the same data on a grid
+    windows: str, pandas.Timedelta or sequence of these, optional
+        The window lengths, e.g. '1hr', '2hr', '6hr'
+    sample_period: pandas.Timedelta, optional
+        The sampling period. The mean is NaN unless the window holds exactly
+        window/sample_period + 1 samples (13 samples for 2hr of 10 min data).
+        A grid uses its own period
+
+    Returns
+    -------
+    pandas.DataFrame
+        For every window, the "<window>_std_" columns followed by the
+        "<window>_mean_" columns, with the same index as data (the slots
+        with a sample, for a grid).
+        The standard deviation uses ddof=1 and ignores NaN, like
+        pandas.DataFrame.std
+    """
+    windows = window_list(windows)
+
+    rows = None
+    data_index = data.index
+    if isinstance(data, TimeGrid):
+        sample_period = data.period
+        rows = np.flatnonzero(data.present)
+        data_index = data_index[rows]
+        # The number of samples in the slots before each slot
+        samples = np.zeros(len(data) + 1, dtype=np.int64)
+        np.cumsum(data.present, out=samples[1:])
+    values = data.values.astype(np.float64)
+    dtype = data.values.dtype if data.values.dtype.kind == 'f' else np.float64
+    valid = ~np.isnan(values)
+
+    # Centre each column before summing to limit cancellation in the variance
+    with np.errstate(all='ignore'):
+        centre = np.nanmean(values, axis=0)
+    centre[np.isnan(centre)] = 0
+    centred = np.where(valid, values - centre, 0)
+
+    n_rows, n_cols = values.shape
+    sum_x = np.zeros((n_rows + 1, n_cols))
+    sum_xx = np.zeros((n_rows + 1, n_cols))
+    count = np.zeros((n_rows + 1, n_cols))
+    np.cumsum(centred, axis=0, out=sum_x[1:])
+    np.cumsum(centred * centred, axis=0, out=sum_xx[1:])
+    np.cumsum(valid, axis=0, out=count[1:])
+    del centred, valid
+    eps = np.finfo(np.float64).eps
+
+    if rows is None:
+        index = data.index.values
+        end = np.searchsorted(index, index, side='right')
+    else:
+        end = rows + 1
+    features = []
+    for window in windows:
+        slots = window // sample_period
+        if rows is None:
+            start = np.searchsorted(index, index - window.to_timedelta64(), side='left')
+            full = (end - start) == slots + 1
+        else:
+            start = np.maximum(rows - slots, 0)
+            full = (samples[end] - samples[start]) == slots + 1
+        n = count[end] - count[start]
+        s1 = sum_x[end] - sum_x[start]
+        s2 = sum_xx[end] - sum_xx[start]
+        with np.errstate(all='ignore'):
+            mean = s1 / n + centre
+            var = (s2 - s1 * s1 / n) / (n - 1)
+            # A bound on the rounding error of the cumulative sums up to end
+            summed = end[:, np.newaxis]
+            rounding = eps * summed * (sum_xx[end] + 2 * np.abs(s1) / n
+                                       * np.sqrt(summed * sum_xx[end]))
+            redo = np.nonzero((n >= 2) & ~(var * (n - 1) > rounding))
+        var[redo] = window_var(values, start, end, *redo)
+        mean[(n == 0) | ~full[:, np.newaxis]] = np.nan
+        var[n < 2] = np.nan
+        np.maximum(var, 0, out=var)
+
+        label = window_label(window)
+        features.append(pd.DataFrame(
+            np.sqrt(var).astype(dtype), index=data_index,
+            columns=[label + '_std_' + str(name) for name in data.columns]))
+        features.append(pd.DataFrame(
+            mean.astype(dtype), index=data_index,
+            columns=[label + '_mean_' + str(name) for name in data.columns]))
+
+    return pd.concat(features, axis=1)
+
+
+# The Main_Status codes of the 5 main faults
+FAULT_MAIN_STATUSES = (80, 62, 228, 60, 9)
+
+
+def fault_labels(times, status_times, statuses, fault_codes=FAULT_MAIN_STATUSES,
+                 holdoff_before='0min', holdoff_after='0min'):
+    """
+    Labels each time with the fault status active at that time, or 0.
+
+    A status is active strictly after its timestamp and strictly before the
+    timestamp of the next status, and the last status runs to the end.
+    Statuses are sorted by time, and every time is then looked up with one
+    searchsorted, instead of building a mask over all times for each status.
+
+    Parameters
+    ----------
+    times: pandas.DatetimeIndex or array of datetime64
+        The times to label
+    status_times: sequence of datetime64
+        The time of each status change
+    statuses: sequence of int
+        The Main_Status of each status change
+    fault_codes: sequence of int, optional
+        The statuses labelled as faults
+    holdoff_before: str or pandas.Timedelta, optional
+        Fault periods are extended this far back before the fault starts
+    holdoff_after: str or pandas.Timedelta, optional
+        Fault periods are extended this far past the end of the fault
+
+    Returns
+    -------
+    numpy.ndarray of float
+        The fault status at each time, 0 where there is no fault
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    labels = np.zeros(len(times))
+    starts, ends, codes = fault_intervals(status_times, statuses, fault_codes,
+                                          holdoff_before, holdoff_after)
+    if len(starts) == 0:
+        return labels
+
+    # The latest fault that started strictly before each time
+    latest = np.searchsorted(starts, times, side='left') - 1
+    active = latest >= 0
+    active[active] = times[active] < ends[latest[active]]
+    labels[active] = codes[latest[active]]
+    return labels
+
+
+def fault_intervals(status_times, statuses, fault_codes=FAULT_MAIN_STATUSES,
+                    holdoff_before='0min', holdoff_after='0min'):
+    """
+    Returns the fault periods of a status table, see fault_labels().
+
+    Returns
+    -------
+    starts, ends: numpy.ndarray
+        The datetime64[ns] start and end of each fault, including the
+        holdoffs, sorted by start. A fault is active strictly between them
+    codes: numpy.ndarray
+        The Main_Status of each fault
+    """
+    status_times = np.asarray(status_times, dtype='datetime64[ns]')
+    statuses = np.asarray(statuses)
+    if len(statuses) == 0:
+        return status_times, status_times, statuses
+
+    order = np.argsort(status_times, kind='stable')
+    status_times = status_times[order]
+    statuses = statuses[order]
+    end_times = np.append(status_times[1:], np.datetime64('NaT', 'ns'))
+
+    is_fault = np.isin(statuses, fault_codes)
+    starts = status_times[is_fault] - pd.Timedelta(holdoff_before).to_timedelta64()
+    ends = end_times[is_fault] + pd.Timedelta(holdoff_after).to_timedelta64()
+    # The last status has no end
+    if len(ends) and np.isnat(ends[-1]):
+        ends[-1] = np.datetime64(pd.Timestamp.max.as_unit('ns'))
+    return starts, ends, statuses[is_fault]
+
+
+# The expert features, as (name, operation, inputs).
+# 'mean' is the row mean of the inputs, ignoring NaN.
+# 'diff' is the first input minus the second. Inputs are SCADA fields or
+# 'mean' features defined earlier in the list.
+EXPERT_FEATURES = (
+    # Averages
+    ('Avg_Sys_1_inverters_cabinet_temp', 'mean', (
+        'CS101__Sys_1_inverter_1_cabinet_temp', 'CS101__Sys_1_inverter_2_cabinet_temp',
+        'CS101__Sys_1_inverter_3_cabinet_temp', 'CS101__Sys_1_inverter_4_cabinet_temp',
+        'CS101__Sys_1_inverter_5_cabinet_temp', 'CS101__Sys_1_inverter_6_cabinet_temp',
+        'CS101__Sys_1_inverter_7_cabinet_temp')),
+    ('Avg_Sys_2_inverters_cabinet_temp', 'mean', (
+        'CS101__Sys_2_inverter_1_cabinet_temp', 'CS101__Sys_2_inverter_2_cabinet_temp',
+        'CS101__Sys_2_inverter_3_cabinet_temp', 'CS101__Sys_2_inverter_4_cabinet_temp')),
+    ('Avg_bearing_temp', 'mean', ('CS101__Front_bearing_temp', 'CS101__Rear_bearing_temp')),
+    ('Avg_pitch_cabinet_blade_temp', 'mean', (
+        'CS101__Pitch_cabinet_blade_A_temp', 'CS101__Pitch_cabinet_blade_B_temp',
+        'CS101__Pitch_cabinet_blade_C_temp')),
+    ('Avg_rotor_temp', 'mean', ('CS101__Rotor_temp_1', 'CS101__Rotor_temp_2')),
+    ('Avg_stator_temp', 'mean', ('CS101__Stator_temp_1', 'CS101__Stator_temp_2')),
+    ('Avg_nacelle_ambient_temp', 'mean', (
+        'CS101__Nacelle_ambient_temp_1', 'CS101__Nacelle_ambient_temp_2')),
+
+    # Max and Min of (wind speed, rotation, power, reactive power)
+    ('Dif_max_min_windspeed', 'diff', ('WEC__max_windspeed', 'WEC__min_windspeed')),
+    ('Dif_max_min_rotation', 'diff', ('WEC_max_Rotation', 'WEC_min_Rotation')),
+    ('Dif_max_min_Power', 'diff', ('WEC_max_Power', 'WEC_min_Power')),
+    ('Dif_max_min_reactive_Power', 'diff', ('WEC_max_reactive_Power', 'WEC_min_reactive_Power')),
+
+    # Max and Average of (wind speed, rotation, power, reactive power)
+    ('Dif_max_avg_windspeed', 'diff', ('WEC__max_windspeed', 'WEC_ava_windspeed')),
+    ('Dif_max_avg_rotation', 'diff', ('WEC_max_Rotation', 'WEC_ava_Rotation')),
+    ('Dif_max_avg_Power', 'diff', ('WEC_max_Power', 'WEC_ava_Power')),
+    ('Dif_max_avg_reactive_Power', 'diff', ('WEC_max_reactive_Power', 'WEC_ava_reactive_Power')),
+
+    # Min and Average of (wind speed, rotation, power, reactive power)
+    ('Dif_avg_min_windspeed', 'diff', ('WEC_ava_windspeed', 'WEC__min_windspeed')),
+    ('Dif_avg_min_rotation', 'diff', ('WEC_ava_Rotation', 'WEC_min_Rotation')),
+    ('Dif_avg_min_Power', 'diff', ('WEC_ava_Power', 'WEC_min_Power')),
+    ('Dif_avg_min_reactive_Power', 'diff', ('WEC_ava_reactive_Power', 'WEC_min_reactive_Power')),
+
+    # Available Power (from wind, technical reasons, force majeure reasons, force external reasons)
+    # Diff_P_wind_P_technical has always been calculated with the external reasons
+    ('Diff_P_wind_P_technical', 'diff', (
+        'WEC_ava_available_P_from_wind', 'WEC_ava_Available_P_force_external_reasons')),
+    ('Diff_P_wind_P_majeure', 'diff', (
+        'WEC_ava_available_P_from_wind', 'WEC_ava_Available_P_force_majeure_reasons')),
+    ('Diff_P_technical_P_majeure', 'diff', (
+        'WEC_ava_available_P_technical_reasons', 'WEC_ava_Available_P_force_majeure_reasons')),
+    ('Diff_P_technical_P_external', 'diff', (
+        'WEC_ava_available_P_technical_reasons', 'WEC_ava_Available_P_force_external_reasons')),
+    ('Diff_P_majeure_P_external', 'diff', (
+        'WEC_ava_Available_P_force_majeure_reasons', 'WEC_ava_Available_P_force_external_reasons')),
+
+    # Average Power and Available power
+    # Diff_avg_Power_P_wind has always been calculated with the external reasons
+    ('Diff_avg_Power_P_wind', 'diff', (
+        'WEC_ava_Power', 'WEC_ava_Available_P_force_external_reasons')),
+
+    # Inverter Cabinet Temperatures and Average Inverter Cabinet Temperature by system
+    ('Diff_Avg_Sys_1_inverter_1', 'diff', (
+        'CS101__Sys_1_inverter_1_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_1_inverter_2', 'diff', (
+        'CS101__Sys_1_inverter_2_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_1_inverter_3', 'diff', (
+        'CS101__Sys_1_inverter_3_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_1_inverter_4', 'diff', (
+        'CS101__Sys_1_inverter_4_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_1_inverter_5', 'diff', (
+        'CS101__Sys_1_inverter_5_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_1_inverter_6', 'diff', (
+        'CS101__Sys_1_inverter_6_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_1_inverter_7', 'diff', (
+        'CS101__Sys_1_inverter_7_cabinet_temp', 'Avg_Sys_1_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_2_inverter_1', 'diff', (
+        'CS101__Sys_2_inverter_1_cabinet_temp', 'Avg_Sys_2_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_2_inverter_2', 'diff', (
+        'CS101__Sys_2_inverter_2_cabinet_temp', 'Avg_Sys_2_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_2_inverter_3', 'diff', (
+        'CS101__Sys_2_inverter_3_cabinet_temp', 'Avg_Sys_2_inverters_cabinet_temp')),
+    ('Diff_Avg_Sys_2_inverter_4', 'diff', (
+        'CS101__Sys_2_inverter_4_cabinet_temp', 'Avg_Sys_2_inverters_cabinet_temp')),
+
+    # Front and Rear Bearing Temperature, and their Average
+    ('Diff_font_rear_bearing', 'diff', ('CS101__Front_bearing_temp', 'CS101__Rear_bearing_temp')),
+    ('Diff_font_avg_bearing', 'diff', ('CS101__Front_bearing_temp', 'Avg_bearing_temp')),
+    ('Diff_rear_avg_bearing', 'diff', ('CS101__Rear_bearing_temp', 'Avg_bearing_temp')),
+
+    # Pitch Cabinet Blade Temperatures, and their Average
+    ('Diff_cabinet_A_B_temp', 'diff', (
+        'CS101__Pitch_cabinet_blade_A_temp', 'CS101__Pitch_cabinet_blade_B_temp')),
+    ('Diff_cabinet_A_C_temp', 'diff', (
+        'CS101__Pitch_cabinet_blade_A_temp', 'CS101__Pitch_cabinet_blade_C_temp')),
+    ('Diff_cabinet_B_C_temp', 'diff', (
+        'CS101__Pitch_cabinet_blade_B_temp', 'CS101__Pitch_cabinet_blade_C_temp')),
+    ('Diff_cabinet_A_avg_temp', 'diff', (
+        'CS101__Pitch_cabinet_blade_A_temp', 'Avg_pitch_cabinet_blade_temp')),
+    ('Diff_cabinet_B_avg_temp', 'diff', (
+        'CS101__Pitch_cabinet_blade_B_temp', 'Avg_pitch_cabinet_blade_temp')),
+    ('Diff_cabinet_C_avg_temp', 'diff', (
+        'CS101__Pitch_cabinet_blade_C_temp', 'Avg_pitch_cabinet_blade_temp')),
+
+    # Rotor Temperatures, and their Average
+    ('Diff_rotor_temps', 'diff', ('CS101__Rotor_temp_1', 'CS101__Rotor_temp_2')),
+    ('Dif_rotor_1_avg_temps', 'diff', ('CS101__Rotor_temp_1', 'Avg_rotor_temp')),
+    ('Dif_rotor_2_avg_temps', 'diff', ('CS101__Rotor_temp_2', 'Avg_rotor_temp')),
+
+    # Stator Temperatures, and their Average
+    ('Diff_stator_temps', 'diff', ('CS101__Stator_temp_1', 'CS101__Stator_temp_2')),
+    ('Diff_stator_1_avg_temps', 'diff', ('CS101__Stator_temp_1', 'Avg_stator_temp')),
+    ('Diff_stator_2_avg_temps', 'diff', ('CS101__Stator_temp_2', 'Avg_stator_temp')),
+
+    # Nacelle Ambient Temperatures, and their Average
+    ('Diff_nacelle_ambient_temps', 'diff', (
+        'CS101__Nacelle_ambient_temp_1', 'CS101__Nacelle_ambient_temp_2')),
+    # Diff_avg_nacelle_ambient_temp has always been calculated with temp 2
+    ('Diff_avg_nacelle_ambient_temp', 'diff', (
+        'CS101__Nacelle_ambient_temp_2', 'Avg_nacelle_ambient_temp')),
+
+    # Nacelle Temperature and Nacelle Cabinet Temperature
+    ('Diff_nacelle_cabinet_temp', 'diff', ('CS101__Nacelle_temp', 'CS101__Nacelle_cabinet_temp')),
+
+    # Ambient Temperature and (Nacelle Temperature, Nacelle Cabinet Temperatures, Main Carrier Temperature, Rectifier Temperature, Inverter Cabinet Temperature, Tower Temperature, Control Cabinet Temperature, Transformer Temperature)
+    ('Diff_ambient_nacelle_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Nacelle_temp')),
+    ('Diff_ambient_nacelle_cabinet_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Nacelle_cabinet_temp')),
+    ('Diff_ambient_rectifier_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Rectifier_cabinet_temp')),
+    ('Diff_ambient_main_carrier_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Main_carrier_temp')),
+    ('Diff_ambient_yaw_inverter_cabinet_temp', 'diff', (
+        'CS101__Ambient_temp', 'CS101__Yaw_inverter_cabinet_temp')),
+    ('Diff_ambient_fan_inverter_cabinet_temp', 'diff', (
+        'CS101__Ambient_temp', 'CS101__Fan_inverter_cabinet_temp')),
+    ('Diff_ambient_tower_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Tower_temp')),
+    ('Diff_ambient_control_cabinet_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Control_cabinet_temp')),
+    ('Diff_ambient_transformer_temp', 'diff', ('CS101__Ambient_temp', 'CS101__Transformer_temp')),
+
+    # Generator Temperature and Nacelle Temperature
+    ('Diff_nacelle_stator_1_temp', 'diff', ('CS101__Nacelle_temp', 'CS101__Stator_temp_1')),
+    ('Diff_nacelle_stator_2_temp', 'diff', ('CS101__Nacelle_temp', 'CS101__Stator_temp_2')),
+    ('Diff_nacelle_rotor_1_temp', 'diff', ('CS101__Nacelle_temp', 'CS101__Rotor_temp_1')),
+    ('Diff_nacelle_rotor_2_temp', 'diff', ('CS101__Nacelle_temp', 'CS101__Rotor_temp_2')),
+)
+
+
+def validate_feature_spec(spec, source_columns):
+    """
+    Checks a feature spec like EXPERT_FEATURES against the available fields.
+
+    Raises a ValueError for duplicate output names, unknown operations,
+    a 'diff' without exactly 2 inputs, and inputs that are neither a source
+    field nor a 'mean' feature defined earlier in the spec.
+    """
+    source_columns = set(source_columns)
+    names = set()
+    means = set()
+    for name, operation, inputs in spec:
+        if name in names:
+            raise ValueError("Feature %s is defined more than once" % name)
+        if operation not in ('mean', 'diff'):
+            raise ValueError("Feature %s has unknown operation %r" % (name, operation))
+        if operation == 'diff' and len(inputs) != 2:
+            raise ValueError("Feature %s needs exactly 2 inputs" % name)
+        allowed = source_columns if operation == 'mean' else source_columns | means
+        unknown = [column for column in inputs if column not in allowed]
+        if unknown:
+            raise ValueError("Feature %s has unknown inputs %s" % (name, unknown))
+        names.add(name)
+        if operation == 'mean':
+            means.add(name)
+
+
+def compile_feature_spec(spec, source_columns, names=None):
+    """
+    Validates a feature spec and turns it into index arrays for compute_features.
+
+    Parameters
+    ----------
+    spec: sequence of (name, operation, inputs)
+        The features, e.g. EXPERT_FEATURES
+    source_columns: sequence of str
+        The available source fields, e.g. self.scada_data.columns
+    names: sequence of str, optional
+        Only compile these features (and the means they depend on).
+        All features are compiled by default
+
+    Returns
+    -------
+    dict
+        'names': the output feature names, in order
+        'source_columns': the source fields to pass to compute_features
+        'groups': (source fields x means) 0/1 float32 matrix
+        'copy': (output positions, positions among [sources, means])
+        'diff': (output positions, left positions, right positions)
+    """
+    validate_feature_spec(spec, source_columns)
+    definitions = dict((name, (operation, inputs)) for name, operation, inputs in spec)
+    if names is None:
+        names = [name for name, _, _ in spec]
+    unknown = [name for name in names if name not in definitions]
+    if unknown:
+        raise ValueError("Unknown features %s" % unknown)
+
+    # The means needed by the selected features, in spec order
+    needed = set()
+    for name in names:
+        operation, inputs = definitions[name]
+        needed.update([name] if operation == 'mean' else
+                      [column for column in inputs if column in definitions])
+    means = [name for name, operation, _ in spec if name in needed and operation == 'mean']
+
+    # The source fields needed, in first-use order
+    sources = []
+    for name in means + list(names):
+        operation, inputs = definitions[name]
+        for column in inputs:
+            if column not in definitions and column not in sources:
+                sources.append(column)
+
+    position = dict((column, i) for i, column in enumerate(sources + means))
+    groups = np.zeros((len(sources), len(means)), dtype=np.float32)
+    for j, name in enumerate(means):
+        for column in definitions[name][1]:
+            groups[position[column], j] = 1
+
+    copy_out, copy_in, diff_out, left, right = [], [], [], [], []
+    for i, name in enumerate(names):
+        operation, inputs = definitions[name]
+        if operation == 'mean':
+            copy_out.append(i)
+            copy_in.append(position[name])
+        else:
+            diff_out.append(i)
+            left.append(position[inputs[0]])
+            right.append(position[inputs[1]])
+
+    return {'names': list(names), 'source_columns': sources, 'groups': groups,
+            'copy': (np.array(copy_out, dtype=int), np.array(copy_in, dtype=int)),
+            'diff': (np.array(diff_out, dtype=int), np.array(left, dtype=int),
+                     np.array(right, dtype=int))}
+
+
+def compute_features(values, compiled):
+    """
+    Calculates compiled features from a float32 matrix of the source fields.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        (samples x compiled['source_columns']) float32 matrix
+    compiled: dict
+        The output of compile_feature_spec
+
+    Returns
+    -------
+    numpy.ndarray
+        (samples x compiled['names']) float32 matrix
+    """
+    valid = ~np.isnan(values)
+    with np.errstate(all='ignore'):
+        means = np.where(valid, values, 0) @ compiled['groups']
+        means /= valid.astype(np.float32) @ compiled['groups']
+    extended = np.concatenate([values, means], axis=1)
+
+    features = np.empty((len(values), len(compiled['names'])), dtype=np.float32)
+    copy_out, copy_in = compiled['copy']
+    features[:, copy_out] = extended[:, copy_in]
+    diff_out, left, right = compiled['diff']
+    features[:, diff_out] = extended[:, left] - extended[:, right]
+    return features
+
+
+# Column types of the csv files, in column order
+SCADA_DTYPES = ('<U19',) + ('<f4',) * 62
+STATUS_DTYPES = ('<U19', '<i4', '<i4', '<U9', '<U63', '<i4', '|b1', '|b1', '<f4')
+WARNING_DTYPES = ('<U19', '<i4', '<i4', '<U9', '<U63', '|b1', '<f4')
+
+# The inverters averaged into the Inverter_averages and Inverter_std_dev fields
+INVERTERS = [
+    'CS101__Sys_1_inverter_1_cabinet_temp',
+    'CS101__Sys_1_inverter_2_cabinet_temp',
+    'CS101__Sys_1_inverter_3_cabinet_temp',
+    'CS101__Sys_1_inverter_4_cabinet_temp',
+    'CS101__Sys_1_inverter_5_cabinet_temp',
+    'CS101__Sys_1_inverter_6_cabinet_temp',
+    'CS101__Sys_1_inverter_7_cabinet_temp',
+    'CS101__Sys_2_inverter_1_cabinet_temp',
+    'CS101__Sys_2_inverter_2_cabinet_temp',
+    'CS101__Sys_2_inverter_3_cabinet_temp',
+    'CS101__Sys_2_inverter_4_cabinet_temp']
+
+# The SCADA fields removed by clean_data
+DROPPED_COLUMNS = [
+    # The faulty blade temps
+    'CS101__Blade_A_temp', 'CS101__Blade_B_temp', 'CS101__Blade_C_temp',
+    # The faulty inverters
+    'CS101__Sys_2_inverter_5_cabinet_temp', 'CS101__Sys_2_inverter_6_cabinet_temp',
+    'CS101__Sys_2_inverter_7_cabinet_temp',
+    'WEC_Operating_Hours', 'WEC_Production_kWh', 'WEC_Production_minutes',
+    'Error']
+
+_DELETE_CHARS = set("""~!@#$%^&*()-=+~\\|]}[{';: /?.>,<""")
+
+
+def _validate_names(names):
+    """
+    Cleans up csv header names the same way np.genfromtxt(names=True) does,
+    e.g. 'CS101 : Front bearing temp' becomes 'CS101__Front_bearing_temp'
+    """
+    validated = []
+    seen = {}
+    for i, name in enumerate(names):
+        name = name.strip().replace(' ', '_')
+        name = ''.join(c for c in name if c not in _DELETE_CHARS)
+        if name == '':
+            name = 'f%i' % i
+        elif name in ('return', 'file', 'print'):
+            name += '_'
+        count = seen.get(name, 0)
+        validated.append(name + '_%d' % count if count else name)
+        seen[name] = count + 1
+    return validated
+
+
+def read_typed_csv(filename, dtypes):
+    """
+    Reads a csv file with pandas' C parser into a DataFrame.
+
+    Parameters
+    ----------
+    filename: str
+        The csv file, with a header row
+    dtypes: sequence of str
+        The numpy type of each column, in column order. Strings ('<U..')
+        are read as strings, the rest are converted while parsing
+
+    Returns
+    -------
+    pandas.DataFrame
+        The column names are cleaned up like np.genfromtxt(names=True)
+    """
+    with open(filename, encoding='latin-1') as f:
+        names = _validate_names(f.readline().rstrip('\r\n').split(','))
+    converters = dict(
+        (name, str if np.dtype(dtype).kind == 'U' else np.dtype(dtype))
+        for name, dtype in zip(names, dtypes))
+    return pd.read_csv(filename, header=0, names=names, dtype=converters,
+                       encoding='latin-1')
+
+
+def _parse_time(times):
+    """
+    Converts the 'Time' strings to pandas datetime, shifted back by 1h
+    """
+    return pd.to_datetime(times, format='%d/%m/%Y %H:%M:%S') - pd.Timedelta('1h')
+
+
+def _load_scada_data(filename):
+    scada_data = read_typed_csv(filename, SCADA_DTYPES)
+
+    # Add 2 extra columns to scada - Inverter_averages and Inverter_std_dev - as features
+    scada_data['Inverter_averages'] = scada_data[INVERTERS].mean(axis=1)
+    scada_data['Inverter_std_dev'] = scada_data[INVERTERS].std(axis=1)
+
+    # Convert the "Time" column to pandas datetime and set the 'Time' column to be the index
+    scada_data['Time'] = _parse_time(scada_data['Time'])
+    scada_data = scada_data.set_index('Time', drop=True)
+
+    # Sort the data by timestamp
+    return scada_data.sort_index(kind='stable')
+
+
+def _load_status_data(filename):
+    status_data = read_typed_csv(filename, STATUS_DTYPES)
+    status_data['Time'] = _parse_time(status_data['Time'])
+    return status_data
+
+
+def _load_warning_data(filename):
+    warning_data = read_typed_csv(filename, WARNING_DTYPES)
+    warning_data['Time'] = _parse_time(warning_data['Time'])
+    return warning_data
+
+
+# What the loaders' output depends on, fingerprinted in the import_data cache key
+_LOADER_SCHEMA = (read_typed_csv, _validate_names, _parse_time, SCADA_DTYPES, STATUS_DTYPES,
+                  WARNING_DTYPES, INVERTERS, DROPPED_COLUMNS)
+
+
+def lag_column_name(column, lag, sample_period=SAMPLE_PERIOD):
+    """
+    Returns the name of a lagged field, e.g. 'WEC_ava_Power_t-10min'
+    """
+    minutes = lag * pd.Timedelta(sample_period) // pd.Timedelta('1min')
+    return str(column) + '_t-' + str(minutes) + 'min'
+
+
+class TimeGrid(object):
+    """
+    Data held on a dense, regular time grid.
+
+    Slot s holds the time base + s * period, so any time is found with one
+    subtraction and division instead of a search of a DatetimeIndex, and
+    windows and lags are plain array offsets. Slots without a sample have
+    present False and NaN values, so a missing time can be told apart from
+    a time that is present with NaN values.
+
+    Parameters
+    ----------
+    base: pandas.Timestamp
+        The time of slot 0
+    values: numpy.ndarray
+        (slots x fields) float32 matrix
+    present: numpy.ndarray
+        (slots,) bool array, True where there is a sample
+    columns: sequence of str
+        The field names
+    period: pandas.Timedelta, optional
+        The time between slots
+    """
+
+    def __init__(self, base, values, present, columns, period=SAMPLE_PERIOD):
+        self.base = pd.Timestamp(base)
+        self.values = values
+        self.present = present
+        self.columns = list(columns)
+        self.period = pd.Timedelta(period)
+
+    @classmethod
+    def from_frame(cls, data, period=SAMPLE_PERIOD, base=None, dtype=np.float32):
+        """
+        Places a DataFrame on a grid.
+
+        Parameters
+        ----------
+        data: pandas.DataFrame
+            Numeric data with a DatetimeIndex of unique times, every period
+            apart (with gaps allowed), e.g. self.scada_data after clean_data()
+        period: pandas.Timedelta, optional
+            The time between slots
+        base: pandas.Timestamp, optional
+            The time of slot 0. The first time in data by default
+        dtype: numpy.dtype, optional
+            The type of the value matrix
+
+        Returns
+        -------
+        TimeGrid
+        """
+        period = pd.Timedelta(period)
+        if base is None:
+            base = data.index.min() if len(data) else pd.Timestamp(0)
+        base = pd.Timestamp(base)
+
+        offsets = (data.index - base).values
+        slots, remainder = np.divmod(offsets, period.to_timedelta64())
+        if np.any(remainder != np.timedelta64(0)) or np.any(slots < 0):
+            raise ValueError("The times are not on a %s grid from %s" % (period, base))
+        slots = slots.astype(np.int64)
+        if len(np.unique(slots)) != len(slots):
+            raise ValueError("The times are not unique")
+
+        n_slots = slots.max() + 1 if len(slots) else 0
+        values = np.full((n_slots, data.shape[1]), np.nan, dtype=dtype)
+        values[slots] = data.to_numpy(dtype=dtype)
+        present = np.zeros(n_slots, dtype=bool)
+        present[slots] = True
+        return cls(base, values, present, data.columns, period)
+
+    def __len__(self):
+        return len(self.present)
+
+    @property
+    def index(self):
+        """
+        The time of every slot, as a pandas.DatetimeIndex
+        """
+        return pd.date_range(self.base, periods=len(self), freq=self.period, name='Time')
+
+    def slots(self, times):
+        """
+        Returns the slot of each time, or -1 for times that are not on the grid.
+        Whether the slot holds a sample is given by present[slot].
+        """
+        offsets = (pd.DatetimeIndex(np.atleast_1d(times)) - self.base).values
+        slots, remainder = np.divmod(offsets, self.period.to_timedelta64())
+        slots = slots.astype(np.int64)
+        slots[(remainder != np.timedelta64(0)) | (slots < 0) | (slots >= len(self))] = -1
+        return slots
+
+    def row(self, time):
+        """
+        Returns the values at one time, or None if there is no sample then
+        """
+        slot = self.slots(time)[0]
+        if slot < 0 or not self.present[slot]:
+            return None
+        return self.values[slot]
+
+    def interval_codes(self, starts, ends, codes):
+        """
+        Labels every slot with the code of the latest interval that started
+        strictly before the slot's time, if the slot is before that
+        interval's end, or 0.
+
+        Each interval becomes the range of slots it covers, found with a
+        subtraction and a division, so nothing is searched.
+
+        Parameters
+        ----------
+        starts, ends: numpy.ndarray
+            The datetime64[ns] interval edges, sorted by start, e.g. from
+            fault_intervals()
+        codes: numpy.ndarray
+            The code of each interval
+
+        Returns
+        -------
+        numpy.ndarray of float
+            The code of every slot
+        """
+        labels = np.zeros(len(self))
+        if len(starts) == 0 or len(self) == 0:
+            return labels
+        base = self.base.as_unit('ns').value
+        period = self.period.value
+        # The first slot after each start, and the first slot at or after each end
+        first = (np.asarray(starts, dtype='datetime64[ns]').view(np.int64) - base) // period + 1
+        stop = -((base - np.asarray(ends, dtype='datetime64[ns]').view(np.int64)) // period)
+
+        latest = np.full(len(self), -1, dtype=np.int64)
+        inside = first < len(self)
+        np.maximum.at(latest, np.maximum(first[inside], 0), np.flatnonzero(inside))
+        np.maximum.accumulate(latest, out=latest)
+        active = latest >= 0
+        active[active] = np.arange(len(self))[active] < stop[latest[active]]
+        labels[active] = np.asarray(codes)[latest[active]]
+        return labels
+
+    def windows(self, length):
+        """
+        Returns read-only sliding windows of length slots, without copying.
+
+        Returns
+        -------
+        windows: numpy.ndarray
+            (slots - length + 1) x fields x length view, oldest slot first.
+            Window w ends at slot w + length - 1
+        complete: numpy.ndarray
+            True for the windows where every slot holds a sample
+        """
+        if len(self) < length:
+            return (np.zeros((0, len(self.columns), length), dtype=self.values.dtype),
+                    np.zeros(0, dtype=bool))
+        view = np.lib.stride_tricks.sliding_window_view
+        return (view(self.values, length, axis=0),
+                view(self.present, length).all(axis=1))
+
+    def to_frame(self, present_only=True):
+        """
+        Returns the grid as a DataFrame, by default only the slots with a sample
+        """
+        if present_only:
+            slots = np.flatnonzero(self.present)
+            return pd.DataFrame(self.values[slots], index=self.index[slots],
+                                columns=self.columns, copy=False)
+        return pd.DataFrame(self.values, index=self.index, columns=self.columns)
+
+
+class LaggedFeatures(object):
+    """
+    Lagged copies of every field, as a strided view over one array.
+
+    The data is placed once on a TimeGrid, and sliding windows give each
+    time its n previous samples without copying. Only to_frame() copies,
+    and only the requested fields and lags.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or TimeGrid
+        Numeric data with a sorted DatetimeIndex, every sample_period apart
+        (with gaps allowed), e.g. self.scada_data after clean_data(),
+        or the same data already on a grid
+    n: int
+        The number of lags
+    sample_period: pandas.Timedelta, optional
+        The time between samples, when data is a DataFrame
+
+    Attributes
+    ----------
+    index: pandas.DatetimeIndex
+        The times of data where all n previous samples exist
+    windows: numpy.ndarray
+        Read-only (grid slots x fields x n+1) view over the grid. Each window
+        holds a slot and the n slots before it, oldest first, with NaN for
+        missing times
+    window_rows: numpy.ndarray
+        The position in windows of each time in index, so that
+        windows[window_rows[k], :, n-i] is lag i of index[k]
+    """
+
+    def __init__(self, data, n, sample_period=SAMPLE_PERIOD):
+        if not isinstance(data, TimeGrid):
+            data = TimeGrid.from_frame(data, sample_period)
+        self.n = n
+        self.sample_period = data.period
+        self.columns = data.columns
+        self._grid = data.values
+
+        # The windows where the time and all n previous times exist
+        self.windows, complete = data.windows(n + 1)
+        self.window_rows = np.flatnonzero(complete)
+        self._rows = self.window_rows + n
+        index_name = data.index.name
+        self.index = pd.DatetimeIndex(data.base + self._rows * data.period, name=index_name)
+
+    def column_name(self, column, lag):
+        """
+        Returns the name of a lagged field, e.g. 'WEC_ava_Power_t-10min'
+        """
+        return lag_column_name(column, lag, self.sample_period)
+
+    def to_frame(self, columns=None, lags=None):
+        """
+        Copies the chosen fields and lags into a DataFrame indexed by self.index.
+
+        Parameters
+        ----------
+        columns: sequence of str, optional
+            The fields to include. All by default
+        lags: sequence of int, optional
+            The lags to include, between 1 and n. 1 to n by default
+
+        Returns
+        -------
+        pandas.DataFrame
+            For each lag, the lagged fields, named like column_name()
+        """
+        columns = self.columns if columns is None else list(columns)
+        lags = range(1, self.n + 1) if lags is None else list(lags)
+        if any(lag < 1 or lag > self.n for lag in lags):
+            raise ValueError("Lags must be between 1 and %d" % self.n)
+        positions = pd.Index(self.columns).get_indexer(columns)
+        if np.any(positions < 0):
+            raise KeyError("Unknown columns %s" % list(np.array(columns)[positions < 0]))
+
+        values = np.empty((len(self._rows), len(lags) * len(columns)), dtype=self._grid.dtype)
+        for i, lag in enumerate(lags):
+            block = slice(i * len(columns), (i + 1) * len(columns))
+            values[:, block] = self._grid[self._rows - lag][:, positions]
+        names = [self.column_name(column, lag) for lag in lags for column in columns]
+        return pd.DataFrame(values, index=self.index, columns=names, copy=False)
+
+
+
+# The status and warning tables
+EVENT_TABLES = ('status_data_wec', 'status_data_rtu', 'warning_data_wec', 'warning_data_rtu')
+# The tables whose rows are states, lasting until the next row of the table
+STATE_TABLES = ('status_data_wec', 'status_data_rtu')
+# The tables used by create_event_features. status_data_wec is left out
+# because the labels are made from it
+EVENT_FEATURE_TABLES = ('warning_data_wec', 'warning_data_rtu', 'status_data_rtu')
+
+# The end of a state that has not ended
+_NEVER = np.datetime64(np.iinfo(np.int64).max, 'ns')
+
+
+def _datetimes(times):
+    """
+    Returns times as a datetime64[ns] array
+    """
+    return pd.DatetimeIndex(np.atleast_1d(times)).to_numpy().astype('datetime64[ns]')
+
+
+class EventIndex(object):
+    """
+    The rows of the status and warning tables as sorted time intervals,
+    per table and per code.
+
+    A status row is a state that lasts until the next row of its table (the
+    last one does not end). A warning row is an event that lasts
+    point_duration. Within a table and code the intervals do not overlap,
+    so their starts and ends are both sorted and every query is a binary
+    search.
+
+    Parameters
+    ----------
+    tables: dict
+        {table name: DataFrame with a 'Time' column and a code column}
+    states: sequence of str, optional
+        The tables whose rows are states
+    point_duration: str or pandas.Timedelta, optional
+        How long the rows of the other tables last
+    code_column: str, optional
+        The column holding the code
+    """
+
+    def __init__(self, tables, states=STATE_TABLES,
+                 point_duration=SAMPLE_PERIOD, code_column='Main_Status'):
+        self.point_duration = pd.Timedelta(point_duration)
+        self.tables = {}
+        for name, data in tables.items():
+            times = _datetimes(data['Time'])
+            order = np.argsort(times, kind='stable')
+            starts = times[order]
+            codes = data[code_column].to_numpy()[order]
+            if name in states:
+                ends = np.append(starts[1:], _NEVER)
+            else:
+                ends = starts + self.point_duration.to_timedelta64()
+
+            unique_codes, inverse = np.unique(codes, return_inverse=True)
+            positions = np.split(np.argsort(inverse, kind='stable'),
+                                 np.cumsum(np.bincount(inverse, minlength=len(unique_codes)))[:-1])
+            self.tables[name] = {
+                'state': name in states, 'starts': starts, 'ends': ends, 'codes': codes,
+                'by_code': dict((code, (starts[rows], ends[rows]))
+                                for code, rows in zip(unique_codes.tolist(), positions))}
+
+    @classmethod
+    def from_data(cls, edata, **kwargs):
+        """
+        Returns the EventIndex of the imported status and warning tables of
+        an EnerconWindTurbineData
+        """
+        tables = {}
+        for name in EVENT_TABLES:
+            data = getattr(edata, name, None)
+            if isinstance(data, pd.DataFrame):
+                tables[name] = data
+        return cls(tables, **kwargs)
+
+    def codes(self, table):
+        """
+        Returns the codes that occur in a table, sorted
+        """
+        return sorted(self.tables[table]['by_code'])
+
+    def _intervals(self, table, code):
+        empty = np.array([], dtype='datetime64[ns]')
+        return self.tables[table]['by_code'].get(code, (empty, empty))
+
+    def active(self, table, time):
+        """
+        Returns the codes active at a time, a list with at most one code for
+        a table of states
+        """
+        time = _datetimes(time)[0]
+        data = self.tables[table]
+        if data['state']:
+            row = np.searchsorted(data['starts'], time, side='right') - 1
+            return [data['codes'][row].item()] if row >= 0 and data['ends'][row] > time else []
+        return [code for code in self.codes(table) if self.overlapping(table, code, time, time)]
+
+    def count(self, table, code, start, end):
+        """
+        Returns the number of times code started in [start, end)
+        """
+        starts, _ = self._intervals(table, code)
+        return int(np.searchsorted(starts, _datetimes(end)[0], side='left') -
+                   np.searchsorted(starts, _datetimes(start)[0], side='left'))
+
+    def overlapping(self, table, code, start, end):
+        """
+        Returns the number of intervals of code that are active at some time
+        in [start, end], i.e. that start at or before end and end after start
+        """
+        starts, ends = self._intervals(table, code)
+        return int(np.searchsorted(starts, _datetimes(end)[0], side='right') -
+                   np.searchsorted(ends, _datetimes(start)[0], side='right'))
+
+    def last(self, table, code, time):
+        """
+        Returns the last time code started at or before time, or None
+        """
+        starts, _ = self._intervals(table, code)
+        row = np.searchsorted(starts, _datetimes(time)[0], side='right') - 1
+        return pd.Timestamp(starts[row]) if row >= 0 else None
+
+    def features(self, times, windows=('2hr',), tables=EVENT_FEATURE_TABLES, min_count=1,
+                 missing=np.nan):
+        """
+        Calculates event history features at many times, with a few binary
+        searches per code.
+
+        For every code of every table, the number of times it started in the
+        window ending at each time, (t - window, t], for every window, the
+        minutes since it last started and whether it has started yet. For
+        tables of states, also whether each code is the active one (one
+        column per code, all 0 before the first state), the minutes the
+        active state has lasted and whether there is an active state yet.
+        The columns are named e.g. "warning_wec_2hr_count_230",
+        "warning_wec_minutes_since_230", "warning_wec_seen_230",
+        "status_rtu_active_2", "status_rtu_minutes_in_status" and
+        "status_rtu_status_known".
+
+        Parameters
+        ----------
+        times: pandas.DatetimeIndex
+            The times, e.g. self.scada_data.index
+        windows: str, pandas.Timedelta or sequence of these, optional
+            The count window lengths
+        tables: sequence of str, optional
+            The tables to use
+        min_count: int, optional
+            Only use the codes that occur at least this many times
+        missing: float, optional
+            The minutes before a code, or a state, first occurs. The "seen"
+            and "status_known" columns are 0 there, so any value can be told
+            apart from a real one
+
+        Returns
+        -------
+        pandas.DataFrame
+            float32 features indexed by times
+        """
+        windows = window_list(windows)
+        index = pd.DatetimeIndex(times)
+        times = _datetimes(index)
+        minute = np.timedelta64(1, 'm')
+
+        columns = {}
+        for table in tables:
+            if table not in self.tables:
+                continue
+            data = self.tables[table]
+            prefix = table.replace('_data', '')
+            codes = [code for code, (starts, _) in sorted(data['by_code'].items())
+                     if len(starts) >= min_count]
+            for code in codes:
+                starts = data['by_code'][code][0]
+                latest = np.searchsorted(starts, times, side='right')
+                for window in windows:
+                    first = np.searchsorted(starts, times - window.to_timedelta64(), side='right')
+                    columns['%s_%s_count_%s' % (prefix, window_label(window), code)] = latest - first
+                since = np.full(len(times), missing, dtype=float)
+                found = latest > 0
+                since[found] = (times[found] - starts[latest[found] - 1]) / minute
+                columns['%s_minutes_since_%s' % (prefix, code)] = since
+                columns['%s_seen_%s' % (prefix, code)] = found
+
+            if data['state']:
+                row = np.searchsorted(data['starts'], times, side='right') - 1
+                found = row >= 0
+                active = np.where(found, data['codes'][np.maximum(row, 0)], None)
+                for code in codes:
+                    columns['%s_active_%s' % (prefix, code)] = found & (active == code)
+                in_status = np.full(len(times), missing, dtype=float)
+                in_status[found] = (times[found] - data['starts'][row[found]]) / minute
+                columns[prefix + '_minutes_in_status'] = in_status
+                columns[prefix + '_status_known'] = found
+
+        return pd.DataFrame(
+            dict((name, np.asarray(values, dtype=np.float32)) for name, values in columns.items()),
+            index=index, columns=list(columns))
+
+
 class EnerconWindTurbineData(object):
     """
     Imports the data and returns arrays of SCADA & status data by
@@ -51,108 +1153,139 @@ class EnerconWindTurbineData(object):
         self.new_features = []
         # Pandas Series of labels
         self.ylabels = []
+        # TimeGrid of the cleaned scada data, see create_grid()
+        self.grid = None
+        # Pandas dataframe of the status and warning history features, see
+        # create_event_features()
+        self.event_features = None
+        # The parameters of the pipeline methods that have been run
+        self.pipeline_params = {}
+        # WindTurbine_profile.StageProfiler recording the stages, see enable_profiling()
+        self.profiler = None
 
-	"""
-	This imports the data, and returns arrays of SCADA, status &
-	warning data. Dates are converted to unix time, and strings are
-	encoded in the correct format (unicode). Two new fields,
-	"Inverter_averages" and "Inverter_std_dev", are also added to
-	the SCADA data. These are the average and standard deviation of
-	all Inverter Temperature fields.
-
-	WARNING: The data is not every 10 minutes. There are errors, 
-	large gaps in data, some values in between 10 minutes, and double values
-	for the same time
-
-	Set's the following fields
-	-------
-	self.scada_data: ndarray
-		The imported and correctly formatted SCADA data
-	self.status_data_wec: ndarray
-		The imported and correctly formatted WEC status data
-	self.status_data_rtu: ndarray
-		The imported and correctly formatted RTU status data
-	self.warning_data_wec: ndarray
-		The imported and correctly formatted WEC warning data
-	self.warning_data_rtu: ndarray
-		The imported and correctly formatted RTU warning data
-	"""
-    def import_data(self):
-        
-        self.scada_data = np.genfromtxt(
-            open(self.scada_data_file, 'rb'), dtype=(
-                '<U19', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4',
-                '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4',
-                '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4',
-                '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4',
-                '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4',
-                '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4',
-                '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4'),
-            delimiter=",", names=True)
-        
-        self.status_data_wec = np.genfromtxt(
-            open(self.status_data_wec_file, 'rb'), dtype=(
-                '<U19', '<i4', '<i4', '<U9', '<U63', '<i4', '|b1', '|b1',
-                '<f4'), delimiter=",", names=True)
-
-        self.status_data_rtu = np.genfromtxt(
-            open(self.status_data_rtu_file, 'rb'), dtype=(
-                '<U19', '<i4', '<i4', '<U9', '<U63', '<i4', '|b1', '|b1',
-                '<f4'), delimiter=",", names=True)
-
-        self.warning_data_wec = np.genfromtxt(
-            open(self.warning_data_wec_file, 'rb'), dtype=(
-                '<U19', '<i4', '<i4', '<U9', '<U63', '|b1', '<f4'),
-            delimiter=",", names=True)
-
-        self.warning_data_rtu = np.genfromtxt(
-            open(self.warning_data_rtu_file, 'rb'), dtype=(
-                '<U19', '<i4', '<i4', '<U9', '<U63', '|b1', '<f4'),
-            delimiter=",", names=True)
-
-        self.scada_data = pd.DataFrame(self.scada_data)
-
-        # Add 2 extra columns to scada - Inverter_averages and Inverter_std_dev - as features
-        inverters = np.array([
-            'CS101__Sys_1_inverter_1_cabinet_temp',
-            'CS101__Sys_1_inverter_2_cabinet_temp',
-            'CS101__Sys_1_inverter_3_cabinet_temp',
-            'CS101__Sys_1_inverter_4_cabinet_temp',
-            'CS101__Sys_1_inverter_5_cabinet_temp',
-            'CS101__Sys_1_inverter_6_cabinet_temp',
-            'CS101__Sys_1_inverter_7_cabinet_temp',
-            'CS101__Sys_2_inverter_1_cabinet_temp',
-            'CS101__Sys_2_inverter_2_cabinet_temp',
-            'CS101__Sys_2_inverter_3_cabinet_temp',
-            'CS101__Sys_2_inverter_4_cabinet_temp'])
-        means = pd.Series(self.scada_data[inverters].mean(axis=1), name='Inverter_averages')
-        stds = pd.Series(self.scada_data[inverters].std(axis=1), name='Inverter_std_dev')
-    
-	# Save the scada data and the inverter means and standard deviations as "scada_data"
-        self.scada_data = pd.concat([self.scada_data, means, stds], axis=1)
-		
-        # Convert the unix time in the "Time" column to pandas datetime and set the 'Time' column to be the index
-        self.scada_data["Time"] = pd.to_datetime(self.scada_data["Time"], format='%d/%m/%Y %H:%M:%S')- pd.Timedelta('1h')
-        self.scada_data = self.scada_data.set_index("Time", drop=True)
-        
-	# Sort the data by timestamp
-        self.scada_data.sort_index(inplace=True)
-        
-	# Convert the unix time in the "Time" column to pandas datetime and set the 'Time' column to be the index
-        self.status_data_wec = pd.DataFrame(self.status_data_wec)
-        self.status_data_wec["Time"] = pd.to_datetime(self.status_data_wec["Time"], format='%d/%m/%Y %H:%M:%S')- pd.Timedelta('1h')
-        self.status_data_rtu = pd.DataFrame(self.status_data_rtu)
-        self.status_data_rtu["Time"] = pd.to_datetime(self.status_data_rtu["Time"], format='%d/%m/%Y %H:%M:%S')- pd.Timedelta('1h')
-        self.warning_data_wec = pd.DataFrame(self.warning_data_wec)
-        self.warning_data_wec["Time"] = pd.to_datetime(self.warning_data_wec["Time"], format='%d/%m/%Y %H:%M:%S')- pd.Timedelta('1h')
-        self.warning_data_rtu = pd.DataFrame(self.warning_data_rtu)
-        self.warning_data_rtu["Time"] = pd.to_datetime(self.warning_data_rtu["Time"], format='%d/%m/%Y %H:%M:%S')- pd.Timedelta('1h')
-
-	'''
-	Optionally inport the data from pickle files
-	'''
+        """
+        This imports the data, and returns arrays of SCADA, status &
+        warning data. Dates are converted to unix time, and strings are
+        encoded in the correct format (unicode). Two new fields,
+        "Inverter_averages" and "Inverter_std_dev", are also added to
+        the SCADA data. These are the average and standard deviation of
+        all Inverter Temperature fields.
+
+        WARNING: The data is not every 10 minutes. There are errors, 
+        large gaps in data, some values in between 10 minutes, and double values
+        for the same time
+
+        Set's the following fields
+        -------
+        self.scada_data: ndarray
+                The imported and correctly formatted SCADA data
+        self.status_data_wec: ndarray
+                The imported and correctly formatted WEC status data
+        self.status_data_rtu: ndarray
+                The imported and correctly formatted RTU status data
+        self.warning_data_wec: ndarray
+                The imported and correctly formatted WEC warning data
+        self.warning_data_rtu: ndarray
+                The imported and correctly formatted RTU warning data
+        """
+    @wtp.profiled(outputs=('scada_data', 'status_data_wec', 'status_data_rtu',
+                           'warning_data_wec', 'warning_data_rtu'))
+    def import_data(self, cache_dir=None, n_jobs=5, verbose=False, mmap=False):
+        """
+        Parameters
+        ----------
+        cache_dir: str, optional
+            If given, each imported table is also saved here as .npy
+            columns. Later runs read these files instead of parsing the csv
+            files again, as long as the csv files, and the code and column
+            types that parse them, are unchanged
+        mmap: bool, optional
+            With cache_dir, map the cached columns instead of reading them.
+            The tables are then read-only
+        n_jobs: int, optional
+            The number of files parsed at the same time. With 1, the files
+            are parsed one after the other without starting any threads
+        verbose: bool, optional
+            Print the load time of each file
+
+        Set's self.import_times, a dict of the load time in seconds of each
+        table, whether it came from the cache, and the total load time
+        """
+        tables = (
+            ('scada_data', self.scada_data_file, _load_scada_data),
+            ('status_data_wec', self.status_data_wec_file, _load_status_data),
+            ('status_data_rtu', self.status_data_rtu_file, _load_status_data),
+            ('warning_data_wec', self.warning_data_wec_file, _load_warning_data),
+            ('warning_data_rtu', self.warning_data_rtu_file, _load_warning_data))
+
+        def load(table):
+            name, source_file, loader = table
+            start = time.time()
+            if cache_dir is None:
+                frame, from_cache = loader(source_file), False
+            else:
+                frame, from_cache = wtc.cached_load(
+                    source_file, os.path.join(cache_dir, name), loader,
+                    schema=wtc.fingerprint(loader, *_LOADER_SCHEMA), mmap=mmap)
+            return name, frame, {'seconds': time.time() - start, 'from_cache': from_cache}
+
+        start = time.time()
+        self.import_times = {}
+        self.grid = None
+        if n_jobs <= 1:
+            loaded = [load(table) for table in tables]
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                loaded = list(executor.map(load, tables))
+        for name, frame, timing in loaded:
+            setattr(self, name, frame)
+            self.import_times[name] = timing
+        self.import_times['total_seconds'] = time.time() - start
+
+        if verbose:
+            for name, _, _ in tables:
+                print("%s: %.3fs (%s)" % (name, self.import_times[name]['seconds'],
+                      'cache' if self.import_times[name]['from_cache'] else 'csv'))
+            print("total: %.3fs" % self.import_times['total_seconds'])
+
+        '''
+        Record the time and memory used by each pipeline stage
+        '''
+    def enable_profiling(self, profiler=None, callback=None, trace_allocations=False):
+        """
+        Parameters
+        ----------
+        profiler: WindTurbine_profile.StageProfiler, optional
+            A profiler to add the stages to, e.g. one shared with other
+            objects. A new one is made by default
+        callback: callable, optional
+            For a new profiler, called with the record of each stage
+        trace_allocations: bool, optional
+            For a new profiler, also record the allocations of each stage
+
+        Returns
+        -------
+        WindTurbine_profile.StageProfiler
+            The profiler, also saved in self.profiler
+        """
+        if profiler is None:
+            profiler = wtp.StageProfiler(callback, trace_allocations)
+        self.profiler = profiler
+        return profiler
+
+    def disable_profiling(self):
+        """
+        Stops recording the stages
+        """
+        self.profiler = None
+
+        '''
+        Optionally inport the data from pickle files
+        '''
+    @wtp.profiled(outputs=('scada_data', 'derived_features', 'ylabels'))
     def import_from_pickle_files(self):
         self.scada_data = pd.read_pickle('scada_data')
+        self.grid = None
         # Reload the expert features, mean features, and std features
         self.new_features = pd.read_pickle('expert_')
         self.mean_std = pd.read_pickle('mean_std')
@@ -168,258 +1301,304 @@ class EnerconWindTurbineData(object):
         
         self.create_labels()
     
-	'''
-	Removes data that is not on the 10 min dot
-	Replaces repetitive timestamps with the mean
-	Removes the known faulty data
-	'''    
+        '''
+        Save the scada data, derived features and labels to a feature store
+        '''
+    @wtp.profiled(inputs=('scada_data', 'derived_features', 'ylabels'))
+    def save_to_store(self, root):
+        """
+        Writes self.scada_data, self.derived_features and self.ylabels (the
+        ones that have been created) to a WindTurbine_store.FeatureStore,
+        partitioned by month, together with self.pipeline_params
+
+        Parameters
+        ----------
+        root: str
+            The feature store directory
+        """
+        store = wts.FeatureStore(root)
+        for name in ('scada_data', 'derived_features', 'ylabels'):
+            data = getattr(self, name, None)
+            if isinstance(data, (pd.DataFrame, pd.Series)):
+                store.write(name, data, params=self.pipeline_params)
+
+        '''
+        Optionally import the features from a feature store
+        '''
+    @wtp.profiled(outputs=('derived_features', 'ylabels', 'scada_data'))
+    def import_from_store(self, root, start=None, end=None, columns=None, scada_data=False):
+        """
+        Reads self.derived_features and self.ylabels from a feature store
+        written by save_to_store, without reading the months or columns
+        that are not needed
+
+        Parameters
+        ----------
+        root: str
+            The feature store directory
+        start: str or pandas.Timestamp, optional
+            The first time to read
+        end: str or pandas.Timestamp, optional
+            The last time to read
+        columns: sequence of str, optional
+            The derived features to read. All by default
+        scada_data: bool, optional
+            Also read self.scada_data
+        """
+        store = wts.FeatureStore(root)
+        tables = store.tables()
+        # A grid of the data imported before would not match these tables
+        self.grid = None
+        self.derived_features = store.read('derived_features', start, end, columns)
+        self.pipeline_params = store.params('derived_features')
+        if 'ylabels' in tables:
+            self.ylabels = store.read('ylabels', start, end).iloc[:, 0]
+        if scada_data:
+            self.scada_data = store.read('scada_data', start, end)
+
+        '''
+        Removes data that is not on the 10 min dot
+        Replaces repetitive timestamps with the mean
+        Removes the known faulty data
+        '''    
+    @wtp.profiled(inputs=('scada_data',), outputs=('scada_data',))
     def clean_data(self):
-        
-        # Keep only the 10 minute samples
-        self.scada_data = self.scada_data[self.scada_data.index.minute % 10 == 0]
-        
-        # Check for identical timestamps and take the average
-        self.scada_data.sort_index(inplace=True)
-        start_of_dupes = 0
-        for i in range(1, len(self.scada_data) + 1):
-            if i == len(self.scada_data) or self.scada_data.index[i] != self.scada_data.index[i - 1]:
-                if i - start_of_dupes > 1:
-                    average = self.scada_data.iloc[start_of_dupes:i].mean()
-                    self.scada_data.iloc[start_of_dupes] = average
-                start_of_dupes = i
-        self.scada_data["___INDEX___"] = self.scada_data.index
-        self.scada_data.drop_duplicates(subset="___INDEX___", keep="first", inplace=True)
-        self.scada_data.drop("___INDEX___", axis=1, inplace=True)
-        
-        # Remove the faulty blade temps
-        self.scada_data.drop(['CS101__Blade_A_temp', 'CS101__Blade_B_temp', 'CS101__Blade_C_temp'], axis=1, inplace=True)
-        
-		# Remove the faulty inverters
-        self.scada_data.drop([ 'CS101__Sys_2_inverter_5_cabinet_temp', 'CS101__Sys_2_inverter_6_cabinet_temp','CS101__Sys_2_inverter_7_cabinet_temp'], axis=1, inplace=True)
-        self.scada_data.drop(['WEC_Operating_Hours', 'WEC_Production_kWh', 'WEC_Production_minutes'], axis=1, inplace=True)
-        self.scada_data.drop(['Error'], axis=1, inplace=True)
-     
-	'''
-	Create new engineering features from the scada_data
-	'''
-    def create_new_features(self):
-        # Create new dataframe for new features
-        self.new_features = pd.DataFrame(index=self.scada_data.index)
+        """
+        The filtering, averaging and column drops are done with one gather
+        of the kept rows and columns, so the data is copied once.
 
-        # Calculate averages
-        self.new_features['Avg_Sys_1_inverters_cabinet_temp']  = self.scada_data[['CS101__Sys_1_inverter_1_cabinet_temp',
-               'CS101__Sys_1_inverter_2_cabinet_temp',
-               'CS101__Sys_1_inverter_3_cabinet_temp',
-               'CS101__Sys_1_inverter_4_cabinet_temp',
-               'CS101__Sys_1_inverter_5_cabinet_temp',
-               'CS101__Sys_1_inverter_6_cabinet_temp',
-               'CS101__Sys_1_inverter_7_cabinet_temp']].mean(axis=1)
+        Set's self.cleaning_stats, a dict with the number of rows before and
+        after cleaning, the number of off-grid rows dropped, the number of
+        timestamps that had duplicates and the number of rows merged into them
+        """
+        index = self.scada_data.index
+        rows_in = len(index)
 
-        self.new_features['Avg_Sys_2_inverters_cabinet_temp'] = self.scada_data[['CS101__Sys_2_inverter_1_cabinet_temp',
-               'CS101__Sys_2_inverter_2_cabinet_temp',
-               'CS101__Sys_2_inverter_3_cabinet_temp',
-               'CS101__Sys_2_inverter_4_cabinet_temp']].mean(axis=1)
+        # Keep only the samples on the SAMPLE_PERIOD boundaries, sorted by
+        # timestamp. A time like 03:00:30 is off the grid, whatever its minute
+        offsets = (index - index.normalize()).values
+        rows = np.flatnonzero(offsets % SAMPLE_PERIOD.to_timedelta64() == np.timedelta64(0))
+        if not index.is_monotonic_increasing:
+            rows = rows[np.argsort(index.values[rows], kind='stable')]
+        times = index.values[rows]
 
-        self.new_features['Avg_bearing_temp'] = self.scada_data[['CS101__Front_bearing_temp', 'CS101__Rear_bearing_temp',]].mean(axis=1)
+        # Remove the known faulty data
+        columns = [name for name in self.scada_data.columns if name not in DROPPED_COLUMNS]
+        column_positions = self.scada_data.columns.get_indexer(columns)
+        values = self.scada_data.to_numpy()
 
-        self.new_features['Avg_pitch_cabinet_blade_temp'] = self.scada_data[['CS101__Pitch_cabinet_blade_A_temp',
-               'CS101__Pitch_cabinet_blade_B_temp',
-               'CS101__Pitch_cabinet_blade_C_temp',]].mean(axis=1)
+        # The first row of each run of identical timestamps is kept
+        is_first = np.ones(len(times), dtype=bool)
+        is_first[1:] = times[1:] != times[:-1]
+        starts = np.flatnonzero(is_first)
+        counts = np.diff(np.append(starts, len(times)))
+        data = values[np.ix_(rows[starts], column_positions)]
 
-        self.new_features['Avg_rotor_temp'] = self.scada_data[[ 'CS101__Rotor_temp_1',
-               'CS101__Rotor_temp_2']].mean(axis=1)
+        # Replace repetitive timestamps with the mean, ignoring NaN
+        dupes = np.flatnonzero(counts > 1)
+        if len(dupes):
+            member = np.repeat(counts > 1, counts)
+            dupe_values = values[np.ix_(rows[member], column_positions)].astype(np.float64)
+            valid = ~np.isnan(dupe_values)
+            dupe_starts = np.append(0, np.cumsum(counts[dupes])[:-1])
+            sums = np.add.reduceat(np.where(valid, dupe_values, 0), dupe_starts, axis=0)
+            n = np.add.reduceat(valid, dupe_starts, axis=0)
+            with np.errstate(all='ignore'):
+                data[dupes] = sums / n
 
-        self.new_features['Avg_stator_temp'] = self.scada_data[['CS101__Stator_temp_1', 'CS101__Stator_temp_2',]].mean(axis=1)
+        self.scada_data = pd.DataFrame(
+            data, index=pd.DatetimeIndex(times[starts], name=index.name),
+            columns=columns, copy=False)
 
-        self.new_features['Avg_nacelle_ambient_temp'] = self.scada_data[['CS101__Nacelle_ambient_temp_1', 
-                                                                           'CS101__Nacelle_ambient_temp_2']].mean(axis=1)
-        
-        # Create features based on differences
-
-        # Max and Min of (wind speed, rotation, power, reactive power)
-        self.new_features['Dif_max_min_windspeed'] = self.scada_data['WEC__max_windspeed'] - self.scada_data['WEC__min_windspeed']
-        self.new_features['Dif_max_min_rotation'] = self.scada_data['WEC_max_Rotation'] - self.scada_data['WEC_min_Rotation']
-        self.new_features['Dif_max_min_Power'] = self.scada_data['WEC_max_Power'] - self.scada_data['WEC_min_Power']
-        self.new_features['Dif_max_min_reactive_Power'] = self.scada_data['WEC_max_reactive_Power'] - self.scada_data['WEC_min_reactive_Power']
-
-        # Max and Average of (wind speed, rotation, power, reactive power)
-        self.new_features['Dif_max_avg_windspeed'] = self.scada_data['WEC__max_windspeed'] - self.scada_data['WEC_ava_windspeed']
-        self.new_features['Dif_max_avg_rotation'] = self.scada_data['WEC_max_Rotation'] - self.scada_data['WEC_ava_Rotation']
-        self.new_features['Dif_max_avg_Power'] = self.scada_data['WEC_max_Power'] - self.scada_data['WEC_ava_Power']
-        self.new_features['Dif_max_avg_reactive_Power'] = self.scada_data['WEC_max_reactive_Power'] - self.scada_data['WEC_ava_reactive_Power']
-
-        # Min and Average of (wind speed, rotation, power, reactive power)\\
-        self.new_features['Dif_avg_min_windspeed'] = self.scada_data['WEC_ava_windspeed'] - self.scada_data['WEC__min_windspeed']
-        self.new_features['Dif_avg_min_rotation'] = self.scada_data['WEC_ava_Rotation'] - self.scada_data['WEC_min_Rotation']
-        self.new_features['Dif_avg_min_Power'] = self.scada_data['WEC_ava_Power'] - self.scada_data['WEC_min_Power']
-        self.new_features['Dif_avg_min_reactive_Power'] = self.scada_data['WEC_ava_reactive_Power'] - self.scada_data['WEC_min_reactive_Power']
-
-        # Available Power (from wind, technical reasons, force majeure reasons, force external reasons)\\
-        self.new_features['Diff_P_wind_P_technical'] = self.scada_data['WEC_ava_available_P_from_wind'] - self.scada_data['WEC_ava_available_P_technical_reasons']
-        self.new_features['Diff_P_wind_P_majeure'] = self.scada_data['WEC_ava_available_P_from_wind'] - self.scada_data['WEC_ava_Available_P_force_majeure_reasons']
-        self.new_features['Diff_P_wind_P_technical'] = self.scada_data['WEC_ava_available_P_from_wind'] - self.scada_data['WEC_ava_Available_P_force_external_reasons']
-        self.new_features['Diff_P_technical_P_majeure'] = self.scada_data['WEC_ava_available_P_technical_reasons'] - self.scada_data['WEC_ava_Available_P_force_majeure_reasons']
-        self.new_features['Diff_P_technical_P_external'] = self.scada_data['WEC_ava_available_P_technical_reasons'] - self.scada_data['WEC_ava_Available_P_force_external_reasons']
-        self.new_features['Diff_P_majeure_P_external'] = self.scada_data['WEC_ava_Available_P_force_majeure_reasons'] - self.scada_data['WEC_ava_Available_P_force_external_reasons']
-
-        # Average Power and Available power (from wind, technical reasons, force majeure reasons, force external reasons)\\
-        self.new_features['Diff_avg_Power_P_wind'] = self.scada_data['WEC_ava_Power'] - self.scada_data['WEC_ava_available_P_from_wind']
-        self.new_features['Diff_avg_Power_P_wind'] = self.scada_data['WEC_ava_Power'] - self.scada_data['WEC_ava_available_P_technical_reasons']
-        self.new_features['Diff_avg_Power_P_wind'] = self.scada_data['WEC_ava_Power'] - self.scada_data['WEC_ava_Available_P_force_majeure_reasons']
-        self.new_features['Diff_avg_Power_P_wind'] = self.scada_data['WEC_ava_Power'] - self.scada_data['WEC_ava_Available_P_force_external_reasons']
-
-        # Inverter Cabinet Temperatures
-        # Inverter Cabinet Temperatures and Average Inverter Cabinet Temperature by system
-        self.new_features['Diff_Avg_Sys_1_inverter_1']  = self.scada_data['CS101__Sys_1_inverter_1_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_1_inverter_2']  = self.scada_data['CS101__Sys_1_inverter_2_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_1_inverter_3']  = self.scada_data['CS101__Sys_1_inverter_3_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_1_inverter_4']  = self.scada_data['CS101__Sys_1_inverter_4_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_1_inverter_5']  = self.scada_data['CS101__Sys_1_inverter_5_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_1_inverter_6']  = self.scada_data['CS101__Sys_1_inverter_6_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_1_inverter_7']  = self.scada_data['CS101__Sys_1_inverter_7_cabinet_temp'] - self.new_features['Avg_Sys_1_inverters_cabinet_temp']
-        
-        self.new_features['Diff_Avg_Sys_2_inverter_1']  = self.scada_data['CS101__Sys_2_inverter_1_cabinet_temp'] - self.new_features['Avg_Sys_2_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_2_inverter_2']  = self.scada_data['CS101__Sys_2_inverter_2_cabinet_temp'] - self.new_features['Avg_Sys_2_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_2_inverter_3']  = self.scada_data['CS101__Sys_2_inverter_3_cabinet_temp'] - self.new_features['Avg_Sys_2_inverters_cabinet_temp']
-        self.new_features['Diff_Avg_Sys_2_inverter_4']  = self.scada_data['CS101__Sys_2_inverter_4_cabinet_temp'] - self.new_features['Avg_Sys_2_inverters_cabinet_temp']
-                                                                          
-        # Front and Rear Bearing Temperature
-        self.new_features['Diff_font_rear_bearing'] = self.scada_data['CS101__Front_bearing_temp'] - self.scada_data['CS101__Rear_bearing_temp']
-
-        # Average Bearing Temperature and (Front and Rear Bearing Temperature)
-        self.new_features['Diff_font_avg_bearing'] = self.scada_data['CS101__Front_bearing_temp'] - self.new_features['Avg_bearing_temp']
-        self.new_features['Diff_rear_avg_bearing'] = self.scada_data['CS101__Rear_bearing_temp'] - self.new_features['Avg_bearing_temp']
-
-        # Pitch Cabinet Blade Temperatures
-        self.new_features['Diff_cabinet_A_B_temp']= self.scada_data['CS101__Pitch_cabinet_blade_A_temp'] - self.scada_data['CS101__Pitch_cabinet_blade_B_temp']
-        self.new_features['Diff_cabinet_A_C_temp']= self.scada_data['CS101__Pitch_cabinet_blade_A_temp'] - self.scada_data['CS101__Pitch_cabinet_blade_C_temp']
-        self.new_features['Diff_cabinet_B_C_temp']= self.scada_data['CS101__Pitch_cabinet_blade_B_temp'] - self.scada_data['CS101__Pitch_cabinet_blade_C_temp']
-
-        # Average Pitch Cabinet Blade Temperature and Pitch Cabinet Blade Temperatures
-        self.new_features['Diff_cabinet_A_avg_temp'] = self.scada_data['CS101__Pitch_cabinet_blade_A_temp'] - self.new_features['Avg_pitch_cabinet_blade_temp']
-        self.new_features['Diff_cabinet_B_avg_temp'] = self.scada_data['CS101__Pitch_cabinet_blade_B_temp'] - self.new_features['Avg_pitch_cabinet_blade_temp']
-        self.new_features['Diff_cabinet_C_avg_temp'] = self.scada_data['CS101__Pitch_cabinet_blade_C_temp'] - self.new_features['Avg_pitch_cabinet_blade_temp']
-
-        # Rotor Temperatures
-        self.new_features['Diff_rotor_temps'] = self.scada_data['CS101__Rotor_temp_1'] - self.scada_data['CS101__Rotor_temp_2']
-
-        # Average Rotor Temperature and Rotor Temperatures
-        self.new_features['Dif_rotor_1_avg_temps'] = self.scada_data['CS101__Rotor_temp_1'] - self.new_features['Avg_rotor_temp']
-        self.new_features['Dif_rotor_2_avg_temps'] = self.scada_data['CS101__Rotor_temp_2'] - self.new_features['Avg_rotor_temp']
-
-        # Stator Temperatures
-        self.new_features['Diff_stator_temps'] = self.scada_data['CS101__Stator_temp_1'] - self.scada_data['CS101__Stator_temp_2']
-
-        # Average Stator Temperature and Stator Temperatures
-        self.new_features['Diff_stator_1_avg_temps'] = self.scada_data['CS101__Stator_temp_1'] - self.new_features['Avg_stator_temp']
-        self.new_features['Diff_stator_2_avg_temps'] = self.scada_data['CS101__Stator_temp_2'] - self.new_features['Avg_stator_temp']
-
-        # Nacelle Ambient Temperatures
-        self.new_features['Diff_nacelle_ambient_temps'] = self.scada_data['CS101__Nacelle_ambient_temp_1'] - self.scada_data['CS101__Nacelle_ambient_temp_2']
-
-        # Average Nacelle Ambient Temperatures and Nacelle Temperatures
-        self.new_features['Diff_avg_nacelle_ambient_temp'] = self.scada_data['CS101__Nacelle_ambient_temp_1'] - self.new_features['Avg_nacelle_ambient_temp']
-        self.new_features['Diff_avg_nacelle_ambient_temp'] = self.scada_data['CS101__Nacelle_ambient_temp_2'] - self.new_features['Avg_nacelle_ambient_temp']
-
-        #  Nacelle Temperature and Nacelle Cabinet Temperature
-        self.new_features['Diff_nacelle_cabinet_temp'] = self.scada_data['CS101__Nacelle_temp'] - self.scada_data['CS101__Nacelle_cabinet_temp']
-
-        # Ambient Temperature and (Nacelle Temperature, Nacelle Cabinet Temperatures, Main Carrier Temperature, Rectifier Temperature, Inverter Cabinet Temperature, Tower Temperature, Control Cabinet Temperature, Transformer Temperature)
-        self.new_features['Diff_ambient_nacelle_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Nacelle_temp']
-        self.new_features['Diff_ambient_nacelle_cabinet_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Nacelle_cabinet_temp']
-        self.new_features['Diff_ambient_rectifier_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Rectifier_cabinet_temp']
-        self.new_features['Diff_ambient_main_carrier_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Main_carrier_temp']
-        self.new_features['Diff_ambient_yaw_inverter_cabinet_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Yaw_inverter_cabinet_temp']
-        self.new_features['Diff_ambient_fan_inverter_cabinet_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Fan_inverter_cabinet_temp']
-        self.new_features['Diff_ambient_tower_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Tower_temp']
-        self.new_features['Diff_ambient_control_cabinet_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Control_cabinet_temp']
-        self.new_features['Diff_ambient_transformer_temp'] = self.scada_data['CS101__Ambient_temp'] - self.scada_data['CS101__Transformer_temp']
-
-        # Generator Temperature and Nacelle Temperature
-        self.new_features['Diff_nacelle_stator_1_temp'] = self.scada_data['CS101__Nacelle_temp'] - self.scada_data['CS101__Stator_temp_1'] 
-        self.new_features['Diff_nacelle_stator_2_temp'] = self.scada_data['CS101__Nacelle_temp'] - self.scada_data['CS101__Stator_temp_2'] 
-        self.new_features['Diff_nacelle_rotor_1_temp'] = self.scada_data['CS101__Nacelle_temp'] - self.scada_data['CS101__Rotor_temp_1'] 
-        self.new_features['Diff_nacelle_rotor_2_temp'] = self.scada_data['CS101__Nacelle_temp'] - self.scada_data['CS101__Rotor_temp_2'] 
-
-    	'''
-	Create the mean and standard deviation features. 
-	These calculations take a long time
-	'''
-    def create_mean_std_features(self):
-        """
-        Calculate the 2hr mean and standard deviation for self.scada_data
+        self.cleaning_stats = {
+            'rows_in': rows_in,
+            'off_grid_rows_dropped': rows_in - len(rows),
+            'duplicate_timestamps': len(dupes),
+            'duplicate_rows_collapsed': len(rows) - len(starts),
+            'rows_out': len(starts)}
+        self.grid = None
+
+    @wtp.profiled(inputs=('scada_data',), outputs=('grid',))
+    def create_grid(self):
+        """
+        Places the cleaned self.scada_data on a regular 10 minute TimeGrid
+        Saves the grid in self.grid, which later stages use instead of
+        searching self.scada_data.index
+        """
+        self.grid = TimeGrid.from_frame(self.scada_data)
+
+        '''
+        Create new engineering features from the scada_data
+        '''
+    @wtp.profiled(inputs=('scada_data',), outputs=('new_features',))
+    def create_new_features(self):
+        """
+        Calculates the features in EXPERT_FEATURES from self.scada_data
+        Saves the new features in self.new_features
+        """
+        compiled = compile_feature_spec(EXPERT_FEATURES, self.scada_data.columns)
+        values = self.scada_data[compiled['source_columns']].to_numpy(dtype=np.float32)
+        self.new_features = pd.DataFrame(
+            compute_features(values, compiled), index=self.scada_data.index,
+            columns=compiled['names'], copy=False)
+
+        '''
+        Create the mean and standard deviation features.
+        All windows are calculated together in one pass over the data
+        '''
+    @wtp.profiled(inputs=('scada_data', 'grid'), outputs=('mean_std',))
+    def create_mean_std_features(self, windows='2hr'):
+        """
+        Calculate the trailing mean and standard deviation for self.scada_data
         Saves the new features in self.mean_std
+        After create_grid(), the windows are slot offsets of self.grid
+
+        Parameters
+        ----------
+        windows: str, pandas.Timedelta or sequence of these, optional
+            The window lengths, e.g. '2hr' or ('1hr', '2hr', '6hr').
+            The columns are named "<window>_mean_<column>" and
+            "<window>_std_<column>". The mean is NaN unless the window is full
+            (13 samples for 2hr)
         """
-        # Make a temporary new dataframe
-        self.mean_std = pd.DataFrame(index=self.scada_data.index)
-        temp_features = self.scada_data.copy()
-        temp_features[:] = np.nan
-        for time in self.scada_data.index: # Calculate the 2 hr average for the column
-            if len(self.scada_data.loc[time-pd.Timedelta('2hr'):time])== 13:
-                temp_features.loc[time] = self.scada_data.loc[time-pd.Timedelta('2hr'):time].mean(axis=0)
-        # Rename the new columns
-        new_column_names = []
-        for name in self.scada_data.columns.values:
-            if len(self.scada_data.loc[time-pd.Timedelta('2hr'):time])== 13:
-                new_column_names.append("2hr_mean_" + name) 
-        temp_features.columns = new_column_names # Rename the columns
-        # Join the temporary features with the new one
-        self.mean_std = pd.concat([temp_features, self.mean_std], axis=1)
-
-        # Make a temporary new dataframe
-        temp_features = self.scada_data.copy()
-        temp_features[:] = np.nan
-        for time in self.scada_data.index: # Calculate the 2 hr average for the column
-            temp_features.loc[time] = self.scada_data.loc[time-pd.Timedelta('2hr'):time].std()
-        # Rename the new columns
-        new_column_names = []
-        for name in self.scada_data.columns.values:
-            new_column_names.append("2hr_std_" + name) 
-        temp_features.columns = new_column_names # Rename the columns
-        # Join the temporary features with the new one
-        self.mean_std = pd.concat([temp_features, self.mean_std], axis=1)
-
-	'''
-	Include lagged variables of self.scada_data
-	New features are saved in self.lagged_features
-	'''
-    def create_lagged_features(self, n):
-        
-        self.lagged_features = pd.DataFrame(index=self.scada_data.index)
-        
-        for i in range(1, n+1):
-            self.temp_lagged_features = self.scada_data.copy()
-
-            # Introduce the delay or lagged features
-            self.temp_lagged_features.index = self.temp_lagged_features.index +pd.Timedelta(str(i*10) + 'm')
-
-            # Rename the new columns
-            new_column_names = []
-            for name in self.scada_data.columns.values:
-                new_column_names.append(str(name) + '_t-' + str(i*10) + 'min') 
-            self.temp_lagged_features.columns = new_column_names # Rename the columns
-            
-            self.lagged_features = pd.concat([self.lagged_features, self.temp_lagged_features], axis=1, join='inner')
-    
-	'''
-	Creates a new pandas.Series with the same index as self.scada_data called self.ylabels
-	self.ylabels = 0 except for the 5 main faults, whereby self.ylabels = Main Status
-	
-	Creates:
-		self.ylabels
-	'''    
-    def create_labels(self):
+        windows = window_list(windows)
+        self.mean_std = rolling_mean_std(self.scada_data if self.grid is None else self.grid,
+                                         windows)
+        self.pipeline_params['windows'] = [window_label(window) for window in windows]
+
+        '''
+        Create features of the status and warning history at each SCADA time.
+        The tables are indexed once, in self.event_index
+        '''
+    @wtp.profiled(inputs=('scada_data', 'status_data_rtu', 'warning_data_wec', 'warning_data_rtu'),
+                  outputs=('event_features',))
+    def create_event_features(self, windows='2hr', tables=EVENT_FEATURE_TABLES, min_count=1,
+                              missing=0.0):
+        """
+        Calculate the warning counts per window, the minutes since each code
+        last occurred and the active status, see EventIndex.features()
+        Saves the new features in self.event_features, which
+        create_derived_features(events=True) includes
+
+        The features can only be made from the status and warning tables, so
+        WindTurbine_score and WindTurbine_stream cannot produce them
+
+        Parameters
+        ----------
+        windows: str, pandas.Timedelta or sequence of these, optional
+            The count window lengths
+        tables: sequence of str, optional
+            The tables to use. status_data_wec is left out by default because
+            the labels are made from it
+        min_count: int, optional
+            Only use the codes that occur at least this many times
+        missing: float, optional
+            The minutes before a code, or a state, first occurs. Not NaN by
+            default, so create_derived_features() keeps those times; the
+            "seen" and "status_known" columns mark them
+        """
+        windows = window_list(windows)
+        self.event_index = EventIndex.from_data(self)
+        self.event_features = self.event_index.features(
+            self.scada_data.index, windows, tables, min_count, missing)
+        self.pipeline_params['event_windows'] = [window_label(window) for window in windows]
+        self.pipeline_params['event_tables'] = list(tables)
+
+        '''
+        Include lagged variables of self.scada_data
+        New features are saved in self.lagged_features
+        '''
+    @wtp.profiled(inputs=('scada_data', 'grid'), outputs=('lagged_features',))
+    def create_lagged_features(self, n, columns=None, lags=None, materialize=True):
+        """
+        Parameters
+        ----------
+        n: int
+            The number of lags. Only times where all n previous samples exist
+            are kept
+        columns: sequence of str, optional
+            Only materialize lags of these fields. All fields by default
+        lags: sequence of int, optional
+            Only materialize these lags, e.g. (1, 6, 144). 1 to n by default
+        materialize: bool, optional
+            If False, only self.lagged is created, and self.lagged_features
+            is left as None. Use self.lagged.to_frame() to materialize later
+
+        Set's self.lagged, a LaggedFeatures view of the lags
+        """
+        data = self.scada_data if self.grid is None else self.grid
+        self.lagged = LaggedFeatures(data, n)
+        self.pipeline_params['n_lags'] = n
+        self.lagged_features = self.lagged.to_frame(columns, lags) if materialize else None
+
+        '''
+        Joins the new, lagged, mean/std and (optionally) event features into self.derived_features
+        '''
+    @wtp.profiled(inputs=('new_features', 'lagged_features', 'mean_std', 'event_features'),
+                  outputs=('derived_features',))
+    def create_derived_features(self, dropna=True, events=False):
+        """
+        Parameters
+        ----------
+        dropna: bool, optional
+            Drop the times where any feature is NaN
+        events: bool, optional
+            Also join self.event_features, see create_event_features().
+            WindTurbine_score and WindTurbine_stream cannot produce them
+        """
+        required = [('new_features', 'create_new_features()'),
+                    ('lagged_features', 'create_lagged_features(materialize=True)'),
+                    ('mean_std', 'create_mean_std_features()')]
+        if events:
+            required.append(('event_features', 'create_event_features()'))
+        features = []
+        for name, method in required:
+            frame = getattr(self, name, None)
+            if not isinstance(frame, pd.DataFrame):
+                raise ValueError("self.%s is missing, call %s first" % (name, method))
+            features.append(frame)
+        self.derived_features = pd.concat(features, axis=1, join='inner')
+        self.pipeline_params['events'] = events
+        if dropna:
+            self.derived_features.dropna(inplace=True)
+
+        '''
+        Creates a new pandas.Series with the same index as self.scada_data called self.ylabels
+        self.ylabels = 0 except for the 5 main faults, whereby self.ylabels = Main Status
         
-        fault_main_statuses = (80, 62, 228, 60, 9)
-        self.ylabels = pd.Series(index = self.derived_features.index)
-        self.ylabels[:] = 0
-        for i in range(0, len(self.status_data_wec)):
-            current_status = self.status_data_wec.iloc[i]['Main_Status'] 
-            if current_status in fault_main_statuses:
-                start_time = self.status_data_wec.iloc[i]['Time']
-                if i == (len(self.status_data_wec)-1):
-                    self.ylabels[self.ylabels.index > start_time] = current_status
-                else:
-                    end_time = self.status_data_wec.iloc[i+1]['Time']
-                    self.ylabels[(self.ylabels.index > start_time) & (self.ylabels.index < end_time)] = current_status
-       
+        Creates:
+                self.ylabels
+        '''    
+    @wtp.profiled(inputs=('derived_features', 'status_data_wec', 'grid'), outputs=('ylabels',))
+    def create_labels(self, fault_codes=FAULT_MAIN_STATUSES, holdoff_before='0min',
+                      holdoff_after='0min'):
+        """
+        Parameters
+        ----------
+        fault_codes: sequence of int, optional
+            The Main_Status codes that are labelled as faults
+        holdoff_before: str or pandas.Timedelta, optional
+            Also label this long before each fault starts as the fault
+        holdoff_after: str or pandas.Timedelta, optional
+            Also label this long after each fault ends as the fault
+
+        After create_grid(), each fault is placed on self.grid as a range of
+        slots instead of searching for every time
+        """
+        self.pipeline_params.update(
+            fault_codes=[int(code) for code in fault_codes],
+            holdoff_before=str(pd.Timedelta(holdoff_before)),
+            holdoff_after=str(pd.Timedelta(holdoff_after)))
+        index = self.derived_features.index
+        if self.grid is None:
+            labels = fault_labels(index, self.status_data_wec['Time'],
+                                  self.status_data_wec['Main_Status'], fault_codes,
+                                  holdoff_before, holdoff_after)
+        else:
+            slots = self.grid.slots(index)
+            if np.any(slots < 0):
+                raise ValueError("derived_features has times that are not on the grid")
+            labels = self.grid.interval_codes(*fault_intervals(
+                self.status_data_wec['Time'], self.status_data_wec['Main_Status'],
+                fault_codes, holdoff_before, holdoff_after))[slots]
+        self.ylabels = pd.Series(labels, index=index)
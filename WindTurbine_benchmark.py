@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import WindTurbine as wt
+import WindTurbine_synthetic as syn
+
+# The pipeline stages, in order, as (name, method arguments)
+STAGES = (
+    ('import_data', {'n_jobs': 1}),
+    ('clean_data', {}),
+    ('create_new_features', {}),
+    ('create_lagged_features', {'n': 6}),
+    ('create_mean_std_features', {'windows': '2hr'}),
+    ('create_derived_features', {}),
+    ('create_labels', {}),
+)
+
+# The stages with the status and warning event features joined in
+EVENT_STAGES = STAGES[:5] + (
+    ('create_event_features', {'windows': '2hr'}),
+    ('create_derived_features', {'events': True}),
+    ('create_labels', {}),
+)
+
+
+def run_stages(files, memory=False, stages=STAGES):
+    """
+    Runs the pipeline stages on one turbine's files.
+
+    Parameters
+    ----------
+    files: dict
+        {file key: path}, the EnerconWindTurbineData arguments
+    memory: bool, optional
+        Trace the Python and numpy allocations of each stage. This slows the
+        stages down, so the times of a memory run are not representative
+    stages: sequence of (str, dict), optional
+        The stages, STAGES or EVENT_STAGES
+
+    Returns
+    -------
+    dict
+        {stage: seconds} or, with memory, {stage: peak MB allocated during
+        the stage}, and 'rows': the number of SCADA rows imported
+    """
+    edata = wt.EnerconWindTurbineData(**files)
+    results = {}
+    if memory:
+        tracemalloc.start()
+    try:
+        for stage, kwargs in stages:
+            if memory:
+                tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+            start_time = time.perf_counter()
+            getattr(edata, stage)(**kwargs)
+            if memory:
+                results[stage] = (tracemalloc.get_traced_memory()[1] - start_memory) / 2.0 ** 20
+            else:
+                results[stage] = time.perf_counter() - start_time
+            if stage == 'import_data':
+                results['rows'] = len(edata.scada_data)
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return results
+
+
+def benchmark(sizes=(1, 3, 12), directory=None, repeat=3, memory=True, seed=0, verbose=False,
+              stages=STAGES):
+    """
+    Times, and memory-profiles, every stage on synthetic data of several sizes.
+
+    Parameters
+    ----------
+    sizes: sequence of float, optional
+        The data lengths, in months of one turbine
+    directory: str, optional
+        Where the synthetic data is kept. Data already there is reused.
+        A temporary directory by default
+    repeat: int, optional
+        The number of timed runs per size. The fastest is kept
+    memory: bool, optional
+        Also run each size once with allocation tracing
+    seed: int, optional
+        The synthetic data seed
+    verbose: bool, optional
+        Print each size as it finishes
+    stages: sequence of (str, dict), optional
+        The stages, STAGES or EVENT_STAGES
+
+    Returns
+    -------
+    dict
+        'sizes' and 'rows': the months and SCADA rows of each size,
+        'stage_list': the [name, method arguments] of each stage run, and
+        'stages': {stage: {'seconds': [...], 'peak_mb': [...],
+        'exponent': ...}}, one value per size. The exponent is the slope of
+        log(seconds) against log(rows), 1 for a stage that scales linearly
+    """
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='windturbine_benchmark_')
+    result = {'sizes': list(sizes), 'rows': [],
+              'stage_list': [[stage, dict(kwargs)] for stage, kwargs in stages],
+              'stages': dict((stage, {'seconds': [], 'peak_mb': []}) for stage, _ in stages)}
+    for months in sizes:
+        size_directory = os.path.join(directory, 'months_%g_seed_%d' % (months, seed))
+        files = dict((key, os.path.join(size_directory, filename))
+                     for key, filename in syn.FILE_NAMES.items())
+        if not all(os.path.isfile(filename) for filename in files.values()):
+            files = syn.generate_turbine(size_directory, months=months, seed=seed)
+
+        runs = [run_stages(files, stages=stages) for _ in range(repeat)]
+        result['rows'].append(runs[0]['rows'])
+        peaks = run_stages(files, memory=True, stages=stages) if memory else {}
+        for stage, _ in stages:
+            result['stages'][stage]['seconds'].append(min(run[stage] for run in runs))
+            result['stages'][stage]['peak_mb'].append(peaks.get(stage))
+        if verbose:
+            print("%g months (%d rows): %.2fs" % (
+                months, result['rows'][-1],
+                sum(stages['seconds'][-1] for stages in result['stages'].values())))
+
+    for stages in result['stages'].values():
+        stages['exponent'] = None
+        if len(sizes) > 1:
+            stages['exponent'] = float(np.polyfit(
+                np.log(result['rows']), np.log(np.maximum(stages['seconds'], 1e-6)), 1)[0])
+    return result
+
+
+def compare_with_baseline(result, baseline, tolerance=0.5, min_seconds=0.05):
+    """
+    Finds the stages that got slower, or use more memory, than a baseline.
+
+    Parameters
+    ----------
+    result: dict
+        A benchmark() result
+    baseline: dict
+        An earlier benchmark() result
+    tolerance: float, optional
+        The allowed increase, as a fraction of the baseline
+    min_seconds: float, optional
+        Times below this are too noisy to compare
+
+    Returns
+    -------
+    list of str
+        One message per regression, empty if there are none
+
+    Raises
+    ------
+    ValueError
+        If the baseline ran different stages, e.g. one with and one without
+        the event features
+    """
+    if baseline.get('stage_list') != result['stage_list']:
+        raise ValueError("The baseline ran the stages %s, not %s; save a new baseline" % (
+            baseline.get('stage_list'), result['stage_list']))
+    regressions = []
+    for stage, stages in result['stages'].items():
+        base = baseline['stages'].get(stage)
+        if base is None:
+            continue
+        for months, seconds, peak_mb in zip(result['sizes'], stages['seconds'], stages['peak_mb']):
+            if months not in baseline['sizes']:
+                continue
+            i = baseline['sizes'].index(months)
+            base_seconds, base_peak_mb = base['seconds'][i], base['peak_mb'][i]
+            if seconds > max(base_seconds * (1 + tolerance), min_seconds):
+                regressions.append("%s at %g months: %.3fs, baseline %.3fs" % (
+                    stage, months, seconds, base_seconds))
+            if peak_mb is not None and base_peak_mb is not None and \
+                    peak_mb > max(base_peak_mb * (1 + tolerance), 1):
+                regressions.append("%s at %g months: %.1f MB, baseline %.1f MB" % (
+                    stage, months, peak_mb, base_peak_mb))
+    return regressions
+
+
+def print_result(result):
+    """
+    Prints the seconds and peak MB of every stage and size, and the exponents
+    """
+    print("%-26s" % 'rows' + ''.join('%18d' % rows for rows in result['rows']) + '  exponent')
+    for stage, stages in result['stages'].items():
+        cells = ''.join('%9.3fs %6s' % (seconds, '' if peak_mb is None else '%5.0fMB' % peak_mb)
+                        for seconds, peak_mb in zip(stages['seconds'], stages['peak_mb']))
+        exponent = '' if stages['exponent'] is None else '%10.2f' % stages['exponent']
+        print("%-26s%s%s" % (stage, cells, exponent))
+
+
+def plot_scaling(result, filename):
+    """
+    Saves a log-log plot of the seconds of every stage against the rows
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    for stage, stages in result['stages'].items():
+        ax.loglog(result['rows'], stages['seconds'], marker='o', label=stage)
+    ax.set_xlabel('SCADA rows')
+    ax.set_ylabel('Seconds')
+    ax.legend()
+    fig.savefig(filename)
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 3, 12],
+                        help='data lengths, in months of one turbine')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--data-dir', help='where to keep the synthetic data')
+    parser.add_argument('--output', help='save the results as json')
+    parser.add_argument('--plot', help='save the scaling curves as an image')
+    parser.add_argument('--baseline', help='fail if slower than these saved results')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save the results as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--events', action='store_true',
+                        help='also create and join the event features')
+    args = parser.parse_args(argv)
+
+    result = benchmark(args.sizes, args.data_dir, args.repeat, not args.no_memory, verbose=True,
+                       stages=EVENT_STAGES if args.events else STAGES)
+    print_result(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1)
+    if args.plot:
+        plot_scaling(result, args.plot)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=1)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare_with_baseline(result, baseline, args.tolerance)
+        except ValueError as error:
+            print("Cannot compare with %s: %s" % (args.baseline, error))
+            return 1
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
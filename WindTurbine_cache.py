@@ -0,0 +1,217 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Bump this when the layout of the cache, or what is stored in it, changes
+CACHE_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the sha1 hex digest of a file, read in chunks
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_key(path, with_hash=True):
+    """
+    Returns the size, mtime and (optionally) hash of a source file.
+    These identify the version of the file a cache was built from.
+    """
+    stat = os.stat(path)
+    key = {'path': os.path.abspath(path), 'size': stat.st_size,
+           'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        key['sha1'] = file_hash(path)
+    return key
+
+
+def fingerprint(*parts):
+    """
+    Returns the sha1 hex digest of the source code of the functions, and the
+    repr of the other values, in parts. Used in a cache key, it changes
+    whenever the code or constants that made the cached data change
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if callable(part):
+            try:
+                text = inspect.getsource(part)
+            except (IOError, OSError, TypeError):
+                text = part.__code__.co_code.hex() if hasattr(part, '__code__') else repr(part)
+        else:
+            text = repr(part)
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _write_manifest(manifest, directory):
+    """
+    Writes a manifest through a temporary file, so a reader never sees a
+    partly written one
+    """
+    temp = os.path.join(directory, MANIFEST + '.tmp')
+    with open(temp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp, os.path.join(directory, MANIFEST))
+
+
+def _to_numpy(series):
+    """
+    Converts a column to a numpy array that np.save can write without pickling
+    """
+    if series.dtype.kind in 'biufcmM':
+        return series.to_numpy()
+    return series.fillna('').to_numpy(dtype=str)
+
+
+def write_frame(frame, directory, meta=None):
+    """
+    Writes a DataFrame as one .npy file per column plus a json manifest.
+
+    The manifest is written last, so a directory without one is an
+    incomplete write and is ignored by read_frame.
+
+    Parameters
+    ----------
+    frame: pandas.DataFrame
+        The data. The index is saved as well
+    directory: str
+        The output directory. Any existing contents are replaced
+    meta: dict, optional
+        Extra json-serialisable information stored in the manifest
+    """
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+
+    columns = []
+    for i, name in enumerate(frame.columns):
+        filename = 'col_%04d.npy' % i
+        values = _to_numpy(frame.iloc[:, i])
+        np.save(os.path.join(directory, filename), values)
+        columns.append({'name': str(name), 'file': filename,
+                        'dtype': values.dtype.str})
+    np.save(os.path.join(directory, 'index.npy'), _to_numpy(frame.index.to_series()))
+
+    manifest = {'version': CACHE_VERSION, 'index': frame.index.name,
+                'rows': len(frame), 'columns': columns, 'meta': meta or {}}
+    _write_manifest(manifest, directory)
+
+
+def read_manifest(directory):
+    """
+    Returns the manifest of a directory written by write_frame, or None if
+    there is no complete, current-version frame there
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def read_frame(directory, columns=None, mmap=True):
+    """
+    Reads a DataFrame written by write_frame.
+
+    Parameters
+    ----------
+    directory: str
+        The directory written by write_frame
+    columns: sequence of str, optional
+        Only read these columns. All columns are read by default
+    mmap: bool, optional
+        Memory-map the column files instead of reading them. Numeric columns
+        then stay backed by the files and nothing is parsed or copied
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise IOError('No columnar data in %s' % directory)
+    mmap_mode = 'r' if mmap else None
+
+    entries = manifest['columns']
+    if columns is not None:
+        by_name = dict((entry['name'], entry) for entry in entries)
+        missing = [name for name in columns if name not in by_name]
+        if missing:
+            raise KeyError('Columns not in %s: %s' % (directory, missing))
+        entries = [by_name[name] for name in columns]
+
+    data = dict(
+        (entry['name'], np.load(os.path.join(directory, entry['file']), mmap_mode=mmap_mode))
+        for entry in entries)
+    index = pd.Index(np.load(os.path.join(directory, 'index.npy'), mmap_mode=mmap_mode),
+                     name=manifest['index'])
+    return pd.DataFrame(data, index=index, columns=[entry['name'] for entry in entries],
+                        copy=False)
+
+
+def cached_load(source_file, cache_dir, loader, schema=None, mmap=False):
+    """
+    Returns loader(source_file), using a columnar cache in cache_dir.
+
+    The cache is reused when it was written with the same schema, and the
+    source file has the same size and mtime as when the cache was written.
+    If only the mtime changed (e.g. the file was copied or touched), the
+    file is hashed and the cache is reused if the contents are unchanged.
+    Otherwise loader is run and the cache rewritten.
+
+    Parameters
+    ----------
+    source_file: str
+        The file the data comes from
+    cache_dir: str
+        The cache directory for this file
+    loader: callable
+        Parses source_file and returns a DataFrame
+    schema: str, optional
+        Identifies how loader parses the file, e.g. a fingerprint() of the
+        loader and the column types. Fingerprints the loader by default
+    mmap: bool, optional
+        Return frames backed by the read-only, memory-mapped cache files.
+        By default the columns are read into ordinary, writable arrays
+
+    Returns
+    -------
+    frame: pandas.DataFrame
+    from_cache: bool
+        True if the data was read from the cache
+    """
+    if schema is None:
+        schema = fingerprint(loader)
+    manifest = read_manifest(cache_dir)
+    if manifest is not None and manifest['meta'].get('schema') == schema:
+        cached = manifest['meta'].get('source', {})
+        current = source_key(source_file, with_hash=False)
+        if cached.get('size') == current['size']:
+            if cached.get('mtime_ns') == current['mtime_ns']:
+                return read_frame(cache_dir, mmap=mmap), True
+            if cached.get('sha1') == file_hash(source_file):
+                manifest['meta']['source']['mtime_ns'] = current['mtime_ns']
+                _write_manifest(manifest, cache_dir)
+                return read_frame(cache_dir, mmap=mmap), True
+
+    key = source_key(source_file)
+    frame = loader(source_file)
+    write_frame(frame, cache_dir, meta={'source': key, 'schema': schema})
+    return read_frame(cache_dir, mmap=mmap), False
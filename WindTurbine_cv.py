@@ -0,0 +1,262 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import WindTurbine as wt
+
+# Bump this when the layout of a saved matrix changes
+MATRIX_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+
+def balanced_weights(labels):
+    """
+    Returns class-balanced sample weights, n_samples / (n_classes * count of
+    the sample's class), as sklearn's class_weight='balanced'. Every class
+    then has the same total weight
+    """
+    labels = np.asarray(labels)
+    if not len(labels):
+        return np.zeros(0)
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    return (float(len(labels)) / (len(counts) * counts))[inverse.ravel()]
+
+
+def fault_episodes(index, labels, max_gap=wt.SAMPLE_PERIOD):
+    """
+    Finds the fault episodes: runs of non-zero labels whose times are at
+    most max_gap apart.
+
+    Parameters
+    ----------
+    index: pandas.DatetimeIndex
+        The sorted times of the labels
+    labels: array-like
+        The labels, 0 for no fault
+    max_gap: str or pandas.Timedelta, optional
+        Faults further apart than this are separate episodes
+
+    Returns
+    -------
+    starts, ends: numpy.ndarray
+        The datetime64[ns] times of the first and last fault of each episode
+    """
+    times = pd.DatetimeIndex(index).to_numpy().astype('datetime64[ns]')
+    fault = np.asarray(labels) != 0
+    times = times[fault]
+    if not len(times):
+        return times, times
+    breaks = np.flatnonzero(np.diff(times) > pd.Timedelta(max_gap).to_timedelta64())
+    return times[np.r_[0, breaks + 1]], times[np.r_[breaks, len(times) - 1]]
+
+
+def row_slices(rows):
+    """
+    Returns the sorted rows as a list of slices, one per contiguous run
+    """
+    rows = np.asarray(rows)
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = rows[np.r_[0, breaks]]
+    stops = rows[np.r_[breaks - 1, len(rows) - 1]] + 1
+    return [slice(start, stop) for start, stop in zip(starts.tolist(), stops.tolist())]
+
+
+def take(matrix, rows):
+    """
+    Returns the rows of a matrix. Contiguous rows, e.g. a test block, are a
+    view that copies nothing; other rows are copied, one run at a time
+    """
+    slices = row_slices(rows)
+    if len(slices) == 1:
+        return matrix[slices[0]]
+    if not slices:
+        return matrix[:0]
+    return np.concatenate([matrix[s] for s in slices])
+
+
+class BlockFolds(object):
+    """
+    Cross-validation folds of contiguous time blocks, as row index arrays.
+
+    The rows are split into n_folds blocks of consecutive times. Each block
+    is the test set of one fold, and the training set is every other row
+    except those within purge of the block: their lagged and rolling window
+    features overlap the test data. A fault episode that crosses the edge
+    of a block is kept out of the training set entirely, with the purge
+    measured from the end of the episode, so no part of a test fault is
+    trained on. Folds are only index arrays, so they cost nothing to
+    change, and can be passed as cv to sklearn or parallel_search.
+
+    Parameters
+    ----------
+    index: pandas.DatetimeIndex
+        The sorted times of the rows, e.g. derived_features.index
+    labels: array-like
+        The label of each row, e.g. ylabels
+    n_folds: int, optional
+        The number of blocks
+    purge: str or pandas.Timedelta, optional
+        The gap kept between the training and test rows. It should be at
+        least the longest lag or window of the features
+    max_gap: str or pandas.Timedelta, optional
+        Faults further apart than this are separate episodes
+
+    Attributes
+    ----------
+    folds: list of (train, test)
+        The row index arrays of each fold
+    episodes: (starts, ends)
+        The fault episodes, see fault_episodes()
+    """
+
+    def __init__(self, index, labels, n_folds=10, purge='2hr', max_gap=wt.SAMPLE_PERIOD):
+        self.index = pd.DatetimeIndex(index)
+        if not self.index.is_monotonic_increasing:
+            raise ValueError("The index must be sorted by time")
+        self.labels = np.asarray(labels)
+        if len(self.labels) != len(self.index):
+            raise ValueError("There are %d labels for %d rows" % (len(self.labels), len(self.index)))
+        self.n_folds = n_folds
+        self.purge = pd.Timedelta(purge)
+        self.episodes = fault_episodes(self.index, self.labels, max_gap)
+
+        times = self.index.to_numpy().astype('datetime64[ns]')
+        purge = self.purge.to_timedelta64()
+        starts, ends = self.episodes
+        self.folds = []
+        for block in np.array_split(np.arange(len(times)), n_folds):
+            if not len(block):
+                continue
+            first, last = times[block[0]], times[block[-1]]
+            # Extend the excluded span over the episodes crossing its edges
+            i = np.searchsorted(ends, first, side='left')
+            if i < len(starts) and starts[i] < first:
+                first = starts[i]
+            j = np.searchsorted(starts, last, side='right') - 1
+            if j >= 0 and ends[j] > last:
+                last = ends[j]
+            before = np.searchsorted(times, first - purge, side='left')
+            after = np.searchsorted(times, last + purge, side='right')
+            train = np.r_[np.arange(before), np.arange(after, len(times))]
+            self.folds.append((train, block))
+
+    @classmethod
+    def from_pipeline(cls, edata, n_folds=10, **kwargs):
+        """
+        Makes the folds of an EnerconWindTurbineData's derived_features and
+        ylabels, purging the longest lag or window the features were made
+        with
+        """
+        spans = [pd.Timedelta(window) for window in edata.pipeline_params.get('windows', [])]
+        if edata.pipeline_params.get('events'):
+            spans += [pd.Timedelta(window)
+                      for window in edata.pipeline_params.get('event_windows', [])]
+        spans.append(edata.pipeline_params.get('n_lags', 0) * pd.Timedelta(wt.SAMPLE_PERIOD))
+        kwargs.setdefault('purge', max(spans))
+        labels = edata.ylabels.reindex(edata.derived_features.index).to_numpy()
+        return cls(edata.derived_features.index, labels, n_folds, **kwargs)
+
+    def get_n_splits(self, X=None, y=None, groups=None):
+        return len(self.folds)
+
+    def split(self, X=None, y=None, groups=None):
+        """
+        Yields the (train, test) row index arrays of each fold, like the
+        sklearn cross-validators
+        """
+        for train, test in self.folds:
+            yield train, test
+
+    def weights(self, fold):
+        """
+        Returns the class-balanced weights of the training rows of a fold,
+        from the label counts of those rows
+        """
+        return balanced_weights(self.labels[self.folds[fold][0]])
+
+    def summary(self):
+        """
+        Returns a DataFrame of the test period, and the number of training,
+        test, purged and fault rows, of each fold
+        """
+        rows = []
+        for train, test in self.folds:
+            rows.append({'test_start': self.index[test[0]], 'test_end': self.index[test[-1]],
+                         'train_rows': len(train), 'test_rows': len(test),
+                         'purged_rows': len(self.index) - len(train) - len(test),
+                         'train_faults': int(np.count_nonzero(self.labels[train])),
+                         'test_faults': int(np.count_nonzero(self.labels[test]))})
+        return pd.DataFrame(rows)
+
+
+def save_matrix(directory, features, labels=None, dtype=np.float32):
+    """
+    Writes features as one (samples x features) .npy matrix, with the
+    labels, the times and a json manifest of the column names.
+
+    The matrix is filled one column at a time, so the features are never
+    copied into memory as a whole.
+
+    Parameters
+    ----------
+    directory: str
+        The output directory
+    features: pandas.DataFrame
+        The features, e.g. derived_features, indexed by time
+    labels: pandas.Series, optional
+        The labels, aligned to the features
+    dtype: numpy dtype, optional
+        The type of the matrix
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    matrix = np.lib.format.open_memmap(os.path.join(directory, 'features.npy'), mode='w+',
+                                       dtype=dtype, shape=features.shape)
+    for i in range(features.shape[1]):
+        matrix[:, i] = features.iloc[:, i].to_numpy()
+    matrix.flush()
+    del matrix
+    np.save(os.path.join(directory, 'index.npy'),
+            features.index.to_numpy().astype('datetime64[ns]'))
+    if labels is not None:
+        np.save(os.path.join(directory, 'labels.npy'),
+                pd.Series(labels).reindex(features.index).to_numpy())
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump({'version': MATRIX_VERSION, 'columns': [str(c) for c in features.columns],
+                   'labels': labels is not None}, f, indent=1)
+
+
+def load_matrix(directory, mmap=True):
+    """
+    Reads a matrix written by save_matrix.
+
+    Parameters
+    ----------
+    directory: str
+        The directory written by save_matrix
+    mmap: bool, optional
+        Memory-map the matrix instead of reading it. Every process that maps
+        the file shares the same pages, and parallel_search hands it to its
+        workers without copying it
+
+    Returns
+    -------
+    features: numpy.ndarray
+        The (samples x features) matrix
+    labels: numpy.ndarray or None
+    index: pandas.DatetimeIndex
+    columns: list of str
+    """
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MATRIX_VERSION:
+        raise IOError("The matrix in %s has an unsupported version" % directory)
+    features = np.load(os.path.join(directory, 'features.npy'), mmap_mode='r' if mmap else None)
+    labels = np.load(os.path.join(directory, 'labels.npy')) if manifest['labels'] else None
+    index = pd.DatetimeIndex(np.load(os.path.join(directory, 'index.npy')))
+    return features, labels, index, manifest['columns']
@@ -1,13 +1,17 @@
 import WindTurbine as wt
 # Initiate the instance
 edata = wt.EnerconWindTurbineData()
+# Record the time and memory of each stage
+profiler = edata.enable_profiling()
 edata.import_data()
 edata.clean_data()
 edata.create_new_features()
 edata.create_lagged_features(6)
 edata.create_mean_std_features()
-edata.derived_features = pd.concat([edata.new_features, edata.lagged_features, edata.mean_std], axis=1, join='inner')
-# To save memory, delete the redundant dataframes
-edata.derived_features.dropna(inplace=True)
-edata.xdata = pd.concat([edata.derived_features, edata.scada_data], axis=1, join='inner')
-edata.xdata.to_pickle('xdata_all_unscaled.p')
\ No newline at end of file
+edata.create_derived_features()
+edata.create_labels()
+# Save the unscaled scada data, derived features and labels, by month
+edata.save_to_store('feature_store')
+# Show where the time and memory went, and keep the report
+print(profiler.format_timeline())
+profiler.save('pipeline_profile.json')
\ No newline at end of file
@@ -0,0 +1,203 @@
+import csv
+import json
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+import WindTurbine as wt
+
+# The files of each turbine, named like the EnerconWindTurbineData arguments
+FILE_KEYS = ('scada_data_file', 'status_data_wec_file', 'status_data_rtu_file',
+             'warning_data_wec_file', 'warning_data_rtu_file')
+
+
+def load_manifest(filename):
+    """
+    Reads a fleet manifest.
+
+    The manifest is either a json object of {turbine: {file key: path}}, or
+    a csv file with a 'turbine' column and one column per file key.
+    Relative paths are relative to the manifest.
+
+    Parameters
+    ----------
+    filename: str
+        The .json or .csv manifest
+
+    Returns
+    -------
+    dict
+        {turbine: {file key: path}}, with the file keys in FILE_KEYS
+    """
+    if filename.endswith('.json'):
+        with open(filename) as f:
+            manifest = json.load(f)
+    else:
+        with open(filename) as f:
+            manifest = dict((row.pop('turbine'), row) for row in csv.DictReader(f))
+
+    root = os.path.dirname(os.path.abspath(filename))
+    turbines = {}
+    for turbine, files in manifest.items():
+        missing = [key for key in FILE_KEYS if not files.get(key)]
+        if missing:
+            raise ValueError("Turbine %s is missing %s in %s" % (turbine, missing, filename))
+        turbines[str(turbine)] = dict(
+            (key, os.path.join(root, files[key])) for key in FILE_KEYS)
+    return turbines
+
+
+def process_turbine(files, n_lags=6, windows='2hr', cache_dir=None, labels=True):
+    """
+    Runs the full import, clean and feature pipeline for one turbine.
+
+    Parameters
+    ----------
+    files: dict
+        {file key: path}, the EnerconWindTurbineData arguments
+    n_lags: int, optional
+        The number of lags
+    windows: str or sequence of str, optional
+        The mean/std window lengths
+    cache_dir: str, optional
+        The import_data cache directory of this turbine
+    labels: bool, optional
+        Add the fault labels as a '__label__' column
+
+    Returns
+    -------
+    pandas.DataFrame
+        The derived features (and labels) of the turbine
+    """
+    edata = wt.EnerconWindTurbineData(**files)
+    # The turbines are already run in parallel, one per worker process
+    edata.import_data(cache_dir=cache_dir, n_jobs=1)
+    edata.clean_data()
+    edata.create_new_features()
+    edata.create_lagged_features(n_lags)
+    edata.create_mean_std_features(windows)
+    edata.create_derived_features()
+    features = edata.derived_features
+    if labels:
+        edata.create_labels()
+        features = features.assign(__label__=edata.ylabels)
+    return features
+
+
+def _limit_memory(memory_limit):
+    """
+    Caps the address space of a worker process at memory_limit bytes more
+    than it uses at start, so a turbine that needs too much memory raises
+    MemoryError in its own worker
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    try:
+        # The worker starts with the address space of the imported libraries
+        with open('/proc/self/statm') as f:
+            memory_limit += int(f.read().split()[0]) * resource.getpagesize()
+    except (IOError, OSError):
+        pass
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _run_turbine(turbine, files, kwargs):
+    """
+    Runs process_turbine in a worker, returning the error instead of raising
+    """
+    try:
+        return turbine, process_turbine(files, **kwargs), None
+    except Exception:
+        return turbine, None, traceback.format_exc()
+
+
+def _run_jobs(jobs, max_workers, initializer, initargs, results, failures, verbose,
+              retry=True):
+    """
+    Runs (turbine, files, kwargs) jobs in one process pool, adding to results
+    and failures. Returns the jobs lost to a broken pool if retry is True.
+    """
+    broken = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initializer,
+                             initargs=initargs) as executor:
+        futures = dict((executor.submit(_run_turbine, *job), job) for job in jobs)
+        for future in as_completed(futures):
+            try:
+                turbine, features, error = future.result()
+            except BrokenProcessPool:
+                if retry:
+                    broken.append(futures[future])
+                    continue
+                turbine, features, error = futures[future][0], None, traceback.format_exc()
+            if error is None:
+                results[turbine] = features
+            else:
+                failures[turbine] = error
+            if verbose:
+                print("%s: %s" % (turbine, 'failed' if error else '%d rows' % len(features)))
+    return broken
+
+
+def process_fleet(turbines, max_workers=None, memory_limit_mb=None, cache_dir=None,
+                  verbose=False, **kwargs):
+    """
+    Runs the pipeline for every turbine of a fleet in a process pool.
+
+    Parameters
+    ----------
+    turbines: dict or str
+        {turbine: {file key: path}}, or a manifest file for load_manifest
+    max_workers: int, optional
+        The number of worker processes. The number of CPUs by default
+    memory_limit_mb: int, optional
+        The extra address space each worker may use, in MB (Unix only).
+        A turbine that needs more fails with a MemoryError
+    cache_dir: str, optional
+        The import_data cache directory. Each turbine gets a subdirectory
+    verbose: bool, optional
+        Print each turbine as it finishes
+    **kwargs
+        Passed on to process_turbine, e.g. n_lags, windows, labels
+
+    Returns
+    -------
+    features: pandas.DataFrame
+        The features of all turbines, indexed by (turbine, Time)
+    failures: dict
+        {turbine: traceback} of the turbines that failed
+    """
+    if not isinstance(turbines, dict):
+        turbines = load_manifest(turbines)
+
+    initializer, initargs = None, ()
+    if memory_limit_mb:
+        initializer, initargs = _limit_memory, (int(memory_limit_mb) << 20,)
+
+    jobs = []
+    for turbine, files in turbines.items():
+        turbine_kwargs = dict(kwargs)
+        if cache_dir is not None:
+            turbine_kwargs['cache_dir'] = os.path.join(cache_dir, str(turbine))
+        jobs.append((turbine, files, turbine_kwargs))
+
+    results = {}
+    failures = {}
+    broken = _run_jobs(jobs, max_workers, initializer, initargs, results, failures, verbose)
+    # A worker that dies (e.g. killed for using too much memory) breaks the
+    # whole pool, so the turbines caught up in it are rerun one per pool to
+    # find the one responsible
+    for job in broken:
+        _run_jobs([job], 1, initializer, initargs, results, failures, verbose, retry=False)
+
+    if results:
+        order = [turbine for turbine in turbines if turbine in results]
+        features = pd.concat([results[turbine] for turbine in order], keys=order,
+                             names=['turbine', 'Time'])
+    else:
+        features = pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=['turbine', 'Time']))
+    return features, failures
@@ -0,0 +1,274 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import WindTurbine_train as wtt
+
+# Features are discretized into three levels: below, within and above
+# mean +/- threshold * std, as in the mRMR tool the rankings came from
+N_LEVELS = 3
+
+# Keeps MIQ finite when a feature has no redundancy with the selected ones
+MIQ_EPSILON = 1e-4
+
+# The number of set bits in each byte, for numpy versions without bitwise_count
+_BYTE_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+
+def discretize(data, threshold=1.0, block_size=256):
+    """
+    Discretizes each feature into 0, 1 or 2 for below, within and above
+    mean +/- threshold * std. NaNs are put in the middle level.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame or ndarray
+        (samples x features)
+    threshold: float, optional
+        The number of standard deviations from the mean of the middle level
+    block_size: int, optional
+        The number of columns converted to float64 at a time
+
+    Returns
+    -------
+    ndarray
+        (samples x features) uint8 codes
+    """
+    values = data.to_numpy() if isinstance(data, pd.DataFrame) else np.asarray(data)
+    # Work on the features as rows: DataFrames keep their columns contiguous
+    values = values.T
+    codes = np.empty(values.shape, dtype=np.uint8)
+    for start in range(0, values.shape[0], block_size):
+        block = values[start:start + block_size]
+        if np.isnan(block).any():
+            mean = np.nanmean(block, axis=1, dtype=np.float64)
+            std = np.nanstd(block, axis=1, dtype=np.float64, ddof=1)
+        else:
+            mean = block.mean(axis=1, dtype=np.float64)
+            std = block.std(axis=1, dtype=np.float64, ddof=1)
+        block = block.astype(np.float64)
+        below = block < (mean - threshold * std)[:, np.newaxis]
+        above = block > (mean + threshold * std)[:, np.newaxis]
+        codes[start:start + block_size] = 1 + above.view(np.uint8) - below.view(np.uint8)
+    return codes.T
+
+
+def pack_codes(codes, n_levels=N_LEVELS, block_size=256):
+    """
+    Packs integer codes into one bitset over the samples per level.
+
+    Parameters
+    ----------
+    codes: ndarray
+        (samples x features) or (samples,) codes from 0 to n_levels - 1
+
+    Returns
+    -------
+    ndarray
+        (n_levels x features x words) uint64, or (n_levels x words) for a
+        single column. Bit i of [level, feature] is set if sample i of the
+        feature has that level
+    """
+    codes = np.asarray(codes)
+    column = codes.ndim == 1
+    # One row per feature, so each row packs into contiguous bytes
+    codes = codes[np.newaxis] if column else codes.T
+    n_columns, n_samples = codes.shape
+    n_bytes = -(-n_samples // 64) * 8
+    bits = np.zeros((n_levels, n_columns, n_bytes), dtype=np.uint8)
+    for start in range(0, n_columns, block_size):
+        block = codes[start:start + block_size]
+        for level in range(n_levels):
+            packed = np.packbits(block == level, axis=1, bitorder='little')
+            bits[level, start:start + block.shape[0], :packed.shape[1]] = packed
+    bits = bits.view(np.uint64)
+    return bits[:, 0] if column else bits
+
+
+def _popcount(words):
+    """
+    Returns the number of set bits of uint64 words, summed over the last axis
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _BYTE_POPCOUNT[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def _mutual_information(counts):
+    """
+    Returns the mutual information, in bits, of a stack of joint histograms
+
+    Parameters
+    ----------
+    counts: ndarray
+        (features x levels x other levels) counts
+    """
+    joint = counts / counts[0].sum()
+    marginal_x = joint.sum(axis=2, keepdims=True)
+    marginal_y = joint.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = joint * np.log2(joint / (marginal_x * marginal_y))
+    return np.nansum(terms, axis=(1, 2))
+
+
+def mutual_information_block(bits, other, columns=None):
+    """
+    Returns the mutual information between features and another variable.
+
+    The joint histograms of all the columns are counted at once, 64 samples
+    at a time, by and-ing the level bitsets and counting the set bits.
+
+    Parameters
+    ----------
+    bits: ndarray
+        (levels x features x words) bitsets from pack_codes
+    other: ndarray
+        (other levels x words) bitsets of the other variable, e.g. the
+        labels or one selected feature
+    columns: slice or ndarray, optional
+        The features to use. All by default
+    """
+    block = bits if columns is None else bits[:, columns]
+    counts = np.empty((block.shape[1], block.shape[0], other.shape[0]), dtype=np.int64)
+    for level in range(block.shape[0]):
+        for other_level in range(other.shape[0]):
+            counts[:, level, other_level] = _popcount(block[level] & other[other_level])
+    return _mutual_information(counts)
+
+
+def _shared_mutual_information(columns, selected):
+    """
+    mutual_information_block in a worker, over the published bitsets,
+    against the labels (selected is None) or a selected feature
+    """
+    bits = wtt.shared_arrays['bits'][1]
+    if selected is None:
+        return mutual_information_block(bits, wtt.shared_arrays['labels'][1], columns)
+    return mutual_information_block(bits, bits[:, selected], columns)
+
+
+def mrmr_rank(features, labels, num_features=100, method='MIQ', threshold=1.0, pool_size=None,
+              n_jobs=1, block_size=256, verbose=False):
+    """
+    Ranks features by minimum redundancy maximum relevance (mRMR).
+
+    The features are discretized once and packed into bitsets. The first
+    feature is the one with the most mutual information with the labels
+    (relevance); each next one maximises its relevance minus (MID) or
+    divided by (MIQ) its mean mutual information with the features already
+    selected (redundancy). Only the redundancy with the latest selected
+    feature is calculated at each step and added to a running sum.
+
+    Parameters
+    ----------
+    features: pandas.DataFrame
+        (samples x features), e.g. edata.derived_features
+    labels: array-like
+        The labels of the samples, e.g. edata.ylabels
+    num_features: int, optional
+        The number of features to select
+    method: str, optional
+        'MIQ' or 'MID'
+    threshold: float, optional
+        The discretize threshold
+    pool_size: int, optional
+        Only the pool_size most relevant features are candidates. All
+        features by default
+    n_jobs: int, optional
+        The number of processes calculating blocks of columns
+    block_size: int, optional
+        The number of columns in one histogram calculation
+    verbose: bool, optional
+        Print each selected feature
+
+    Returns
+    -------
+    pandas.DataFrame
+        The selected features in order, with the 'Order', 'Fea' (1-based
+        column number), 'Name' and 'Score' columns of the mRMR tool output
+    """
+    if method not in ('MIQ', 'MID'):
+        raise ValueError("method must be 'MIQ' or 'MID', not %r" % method)
+    bits = pack_codes(discretize(features, threshold, block_size), block_size=block_size)
+    labels = np.unique(np.asarray(labels), return_inverse=True)[1].ravel()
+    labels = pack_codes(labels, labels.max() + 1)
+    n_columns = bits.shape[1]
+    num_features = min(num_features, n_columns)
+
+    executor = None
+    blocks = []
+    if n_jobs > 1:
+        blocks, spec = wtt.publish_arrays({'bits': bits, 'labels': labels})
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=wtt.attach_arrays,
+                                       initargs=(spec,))
+
+    def mutual_information(candidates, selected):
+        # candidates is a list of column blocks, as slices or index arrays
+        if executor is None:
+            other = labels if selected is None else bits[:, selected]
+            return np.concatenate([mutual_information_block(bits, other, columns)
+                                   for columns in candidates])
+        return np.concatenate(list(executor.map(
+            _shared_mutual_information, candidates, [selected] * len(candidates))))
+
+    try:
+        relevance = mutual_information(
+            [slice(start, start + block_size) for start in range(0, n_columns, block_size)],
+            None)
+        pool = np.argsort(-relevance, kind='stable')
+        if pool_size is not None:
+            pool = pool[:max(pool_size, num_features)]
+        if len(pool) == n_columns:
+            pool = np.arange(n_columns)
+            candidates = [slice(start, start + block_size)
+                          for start in range(0, n_columns, block_size)]
+        else:
+            candidates = [pool[start:start + block_size]
+                          for start in range(0, len(pool), block_size)]
+
+        selected = [int(np.argmax(relevance))]
+        scores = [relevance[selected[0]]]
+        redundancy = np.zeros(len(pool))
+        available = pool != selected[0]
+        while len(selected) < num_features:
+            redundancy += mutual_information(candidates, selected[-1])
+            mean_redundancy = redundancy / len(selected)
+            if method == 'MID':
+                score = relevance[pool] - mean_redundancy
+            else:
+                score = relevance[pool] / (mean_redundancy + MIQ_EPSILON)
+            score[~available] = -np.inf
+            best = int(np.argmax(score))
+            available[best] = False
+            selected.append(int(pool[best]))
+            scores.append(score[best])
+            if verbose:
+                print("%d: %s (%.4f)" % (len(selected), features.columns[selected[-1]],
+                                         scores[-1]))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return pd.DataFrame({'Order': np.arange(1, len(selected) + 1),
+                         'Fea': np.array(selected) + 1,
+                         'Name': features.columns[selected],
+                         'Score': scores})
+
+
+def write_ranking(ranking, filename, method='MIQ'):
+    """
+    Writes a mrmr_rank ranking in the layout of the mRMR tool output, so the
+    notebooks can read it with
+    pd.read_csv(filename, delimiter=' \t ', header=2, engine='python')['Name']
+    """
+    with open(filename, 'w') as f:
+        f.write("*** mRMR features (%s) ***\n" % method)
+        f.write("\n")
+        f.write("%d features\n" % len(ranking))
+        f.write("Order \t Fea \t Name \t Score\n")
+        for row in ranking.itertuples(index=False):
+            f.write("%d \t %d \t %s \t %.3f\n" % (row.Order, row.Fea, row.Name, row.Score))
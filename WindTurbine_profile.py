@@ -0,0 +1,222 @@
+import datetime as dt
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def data_stats(data):
+    """
+    Returns the rows, columns and memory in MB of a DataFrame, Series,
+    ndarray or TimeGrid, or None for anything else
+    """
+    if isinstance(data, pd.DataFrame):
+        rows, columns = data.shape
+        nbytes = data.memory_usage(index=True).sum()
+    elif isinstance(data, pd.Series):
+        rows, columns = len(data), 1
+        nbytes = data.memory_usage(index=True)
+    elif isinstance(data, np.ndarray):
+        rows = data.shape[0] if data.ndim else 1
+        columns = data.shape[1] if data.ndim > 1 else 1
+        nbytes = data.nbytes
+    elif hasattr(data, 'values') and hasattr(data, 'present') and hasattr(data, 'columns'):
+        rows, columns = len(data.present), len(data.columns)
+        nbytes = data.values.nbytes + data.present.nbytes
+    else:
+        return None
+    return {'rows': int(rows), 'columns': int(columns), 'memory_mb': float(nbytes) / 2 ** 20}
+
+
+def _rss_mb():
+    """
+    Returns the resident memory of the process in MB, or None if unknown
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2.0 ** 20
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    """
+    Returns the highest resident memory of the process so far in MB, or None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kB
+    return peak / 2.0 ** 20 if sys.platform == 'darwin' else peak / 2.0 ** 10
+
+
+class StageProfiler(object):
+    """
+    Records the cost of each pipeline stage of one or more
+    EnerconWindTurbineData objects, in the order they run.
+
+    For every stage it records the wall and CPU time, the resident memory
+    and its high-water mark, the sizes of the attributes the stage reads
+    and sets, and, with trace_allocations, the memory allocated through
+    tracemalloc. Sharing one profiler between objects gives one timeline
+    for a whole run.
+
+    Parameters
+    ----------
+    callback: callable, optional
+        Called with the record of each stage when it finishes, e.g. to log
+        it or send it to a monitoring system
+    trace_allocations: bool, optional
+        Also record the allocations of each stage. tracemalloc slows the
+        stages down noticeably
+
+    Attributes
+    ----------
+    records: list of dict
+        One record per stage run, see run()
+    """
+
+    def __init__(self, callback=None, trace_allocations=False):
+        self.callback = callback
+        self.trace_allocations = trace_allocations
+        self.records = []
+        self.started = dt.datetime.now()
+        self._start_time = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._frames = []
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def run(self, owner, stage, method, args, kwargs, inputs=(), outputs=()):
+        """
+        Runs one stage and records it.
+
+        The record is a dict of 'stage', 'owner' (the SCADA file of the
+        object), 'depth' (0 unless called from another stage), 'start' and
+        'wall_seconds' (since the profiler was made), 'cpu_seconds',
+        'rss_mb' (after the stage), 'rss_delta_mb', 'peak_rss_mb' and
+        'peak_rss_delta_mb' (the process high-water mark after the stage and
+        its increase), 'allocated_mb' and 'peak_allocated_mb' (None unless
+        trace_allocations), 'inputs' and 'outputs' ({attribute: data_stats})
+        and 'error' (None, or the exception raised by the stage)
+        """
+        record = {'stage': stage, 'owner': getattr(owner, 'scada_data_file', None),
+                  'depth': len(self._frames),
+                  'inputs': dict((name, data_stats(getattr(owner, name, None)))
+                                 for name in inputs)}
+        frame = {'peak': 0}
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._frames:
+                self._frames[-1]['peak'] = max(self._frames[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start_traced'] = current
+        self._frames.append(frame)
+
+        rss = _rss_mb()
+        peak_rss = _peak_rss_mb()
+        start_cpu = time.process_time()
+        start_time = time.perf_counter()
+        record['error'] = None
+        try:
+            return method(owner, *args, **kwargs)
+        except Exception as error:
+            record['error'] = repr(error)
+            raise
+        finally:
+            record['start'] = start_time - self._start_time
+            record['wall_seconds'] = time.perf_counter() - start_time
+            record['cpu_seconds'] = time.process_time() - start_cpu
+            self._frames.pop()
+            record['allocated_mb'] = record['peak_allocated_mb'] = None
+            if self.trace_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(frame['peak'], peak)
+                if self._frames:
+                    self._frames[-1]['peak'] = max(self._frames[-1]['peak'], peak)
+                record['allocated_mb'] = (current - frame['start_traced']) / 2.0 ** 20
+                record['peak_allocated_mb'] = (peak - frame['start_traced']) / 2.0 ** 20
+            record['rss_mb'] = _rss_mb()
+            record['rss_delta_mb'] = None if rss is None else record['rss_mb'] - rss
+            record['peak_rss_mb'] = _peak_rss_mb()
+            record['peak_rss_delta_mb'] = (None if peak_rss is None
+                                           else record['peak_rss_mb'] - peak_rss)
+            record['outputs'] = dict((name, data_stats(getattr(owner, name, None)))
+                                     for name in outputs)
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def report(self):
+        """
+        Returns the records with the run totals, as a json-serialisable dict
+        """
+        return {'started': self.started.isoformat(),
+                'wall_seconds': time.perf_counter() - self._start_time,
+                'cpu_seconds': time.process_time() - self._start_cpu,
+                'peak_rss_mb': _peak_rss_mb(),
+                'stages': self.records}
+
+    def save(self, filename):
+        """
+        Writes report() to a json file
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def format_timeline(self, width=40):
+        """
+        Returns a text timeline of the stages: when each started and how
+        long it took as a bar, its times, memory and output size
+        """
+        end = max([record['start'] + record['wall_seconds'] for record in self.records] + [1e-9])
+        lines = ["%-28s %-*s %8s %8s %9s %9s  %s" % (
+            'stage', width, 'timeline', 'wall s', 'cpu s', 'rss MB', 'alloc MB', 'output')]
+        for record in self.records:
+            first = int(record['start'] / end * width)
+            length = max(int(record['wall_seconds'] / end * width), 1)
+            bar = ('.' * first + '#' * length).ljust(width)[:width]
+            outputs = ', '.join('%s %dx%d' % (name, stats['rows'], stats['columns'])
+                                for name, stats in record['outputs'].items() if stats)
+            lines.append("%-28s %s %8.3f %8.3f %9s %9s  %s" % (
+                '  ' * record['depth'] + record['stage'], bar, record['wall_seconds'],
+                record['cpu_seconds'],
+                '' if record['rss_mb'] is None else '%.0f' % record['rss_mb'],
+                '' if record['allocated_mb'] is None else '%+.1f' % record['allocated_mb'],
+                outputs + (' FAILED' if record['error'] else '')))
+        return '\n'.join(lines)
+
+
+def profiled(inputs=(), outputs=()):
+    """
+    Decorates a pipeline method so it is recorded by the object's profiler.
+
+    When the object has no profiler the method is called directly, so the
+    only cost is one attribute lookup.
+
+    Parameters
+    ----------
+    inputs: sequence of str, optional
+        The attributes the method reads
+    outputs: sequence of str, optional
+        The attributes the method sets
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            return profiler.run(self, method.__name__, method, args, kwargs, inputs, outputs)
+        return wrapper
+    return decorator
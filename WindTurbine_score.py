@@ -0,0 +1,366 @@
+import collections
+import pickle
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import WindTurbine as wt
+
+_LAG_NAME = re.compile(r'^(.+)_t-(\d+)min$')
+_WINDOW_NAME = re.compile(r'^(\d+)(hr|min)_(std|mean)_(.+)$')
+# The start of the names of the EventIndex features
+_EVENT_PREFIXES = tuple(table.replace('_data', '') + '_' for table in wt.EVENT_TABLES)
+
+
+class FaultScorer(object):
+    """
+    A fitted classifier, with its feature selection and scaling, that scores
+    windows of cleaned SCADA rows.
+
+    Only the features the model was fitted on are calculated, and only from
+    the SCADA fields they need: the expert features are compiled for just
+    the selected names, the lags are single column gathers and the
+    mean/std windows only cover the fields that are used.
+
+    Parameters
+    ----------
+    model: object
+        The fitted classifier, with a predict method
+    features: sequence of str
+        The derived feature names the model was fitted on, in order, e.g.
+        the first num_features names of a mrmr_rank ranking
+    columns: sequence of str
+        The cleaned SCADA fields, e.g. edata.scada_data.columns
+    scaler: object, optional
+        A fitted scaler with a transform method, applied before the model
+    sample_period: pandas.Timedelta, optional
+        The time between samples
+    latency_history: int, optional
+        The number of batch latencies kept for latency_summary()
+
+    Attributes
+    ----------
+    needed_columns: list of str
+        The SCADA fields the features are calculated from
+    length: int
+        The number of slots in a window: the scored time and the ones
+        before it that the lags and mean/std windows reach back to
+    """
+
+    def __init__(self, model, features, columns, scaler=None, sample_period=wt.SAMPLE_PERIOD,
+                 latency_history=1000):
+        self.model = model
+        self.features = list(features)
+        self.columns = list(columns)
+        self.scaler = scaler
+        self.sample_period = pd.Timedelta(sample_period)
+        self.latencies = collections.deque(maxlen=latency_history)
+
+        expert_names = set(name for name, _, _ in wt.EXPERT_FEATURES)
+        columns = set(self.columns)
+        self.needed_columns = []
+        expert, direct, windows = [], [], {}
+        for i, name in enumerate(self.features):
+            lag_match = _LAG_NAME.match(name)
+            window_match = _WINDOW_NAME.match(name)
+            if name in expert_names:
+                expert.append((i, name))
+                continue
+            elif name in columns:
+                column, lag = name, 0
+            elif lag_match and lag_match.group(1) in columns:
+                column = lag_match.group(1)
+                lag, remainder = divmod(pd.Timedelta(minutes=int(lag_match.group(2))),
+                                        self.sample_period)
+                if remainder != pd.Timedelta(0):
+                    raise ValueError("Feature %s is not a whole number of samples" % name)
+            elif window_match and window_match.group(4) in columns:
+                number, unit, statistic, column = window_match.groups()
+                window = pd.Timedelta(int(number), 'h' if unit == 'hr' else 'min')
+                windows.setdefault(window, []).append((i, statistic, column))
+                self._need(column)
+                continue
+            elif name.startswith(_EVENT_PREFIXES):
+                raise ValueError("Feature %s is a status/warning event feature, which "
+                                 "can not be scored from SCADA records" % name)
+            else:
+                raise ValueError("Unknown feature %s" % name)
+            direct.append((i, column, lag))
+            self._need(column)
+
+        # The expert features, from their source fields at the scored time
+        self._expert_out = np.array([i for i, _ in expert], dtype=int)
+        self._compiled = None
+        if expert:
+            self._compiled = wt.compile_feature_spec(
+                wt.EXPERT_FEATURES, self.columns, names=[name for _, name in expert])
+            for column in self._compiled['source_columns']:
+                self._need(column)
+
+        position = dict((column, j) for j, column in enumerate(self.needed_columns))
+        n_slots = [window // self.sample_period + 1 for window in windows]
+        self.length = max([lag + 1 for _, _, lag in direct] + n_slots + [1])
+
+        if self._compiled is not None:
+            self._expert_in = np.array(
+                [position[column] for column in self._compiled['source_columns']], dtype=int)
+        # The raw and lagged fields, as (output, field, slot) gathers
+        self._direct_out = np.array([i for i, _, _ in direct], dtype=int)
+        self._direct_field = np.array([position[column] for _, column, _ in direct], dtype=int)
+        self._direct_slot = np.array([self.length - 1 - lag for _, _, lag in direct], dtype=int)
+        # The mean/std windows, each over the fields it uses
+        self._windows = []
+        for (window, stats), slots in zip(windows.items(), n_slots):
+            fields = sorted(set(position[column] for _, _, column in stats))
+            field_position = dict((field, j) for j, field in enumerate(fields))
+            self._windows.append({
+                'slots': slots, 'fields': np.array(fields, dtype=int),
+                'std': [(i, field_position[position[column]])
+                        for i, statistic, column in stats if statistic == 'std'],
+                'mean': [(i, field_position[position[column]])
+                         for i, statistic, column in stats if statistic == 'mean']})
+
+    def _need(self, column):
+        if column not in self.needed_columns:
+            self.needed_columns.append(column)
+
+    @classmethod
+    def from_pipeline(cls, edata, model, features, scaler=None, **kwargs):
+        """
+        Returns a FaultScorer for a model fitted on edata.derived_features
+        """
+        return cls(model, features, edata.scada_data.columns, scaler, **kwargs)
+
+    def prepare(self, scada_data, times=None):
+        """
+        Cuts the windows of some times out of cleaned SCADA data.
+
+        Parameters
+        ----------
+        scada_data: pandas.DataFrame or TimeGrid
+            Cleaned SCADA data of one turbine, e.g. edata.scada_data
+        times: sequence of pandas.Timestamp, optional
+            The times to score. All the times in scada_data by default
+
+        Returns
+        -------
+        times: pandas.DatetimeIndex
+            The times of the windows
+        windows: numpy.ndarray
+            (times x needed_columns x length) contiguous float32 windows,
+            oldest slot first
+        present: numpy.ndarray
+            (times x length) bool, True for the slots that hold a sample
+        """
+        if isinstance(scada_data, wt.TimeGrid):
+            grid = scada_data
+            fields = pd.Index(grid.columns).get_indexer(self.needed_columns)
+            values = grid.values[:, fields]
+        else:
+            grid = wt.TimeGrid.from_frame(scada_data[self.needed_columns], self.sample_period)
+            values = grid.values
+        if times is None:
+            times = grid.index[grid.present]
+        times = pd.DatetimeIndex(times)
+        slots = grid.slots(times)
+        if np.any(slots < 0):
+            raise KeyError("Times outside the data: %s" % list(times[slots < 0]))
+
+        # Pad the start of the grid so every time has a full window
+        pad = self.length - 1
+        values = np.concatenate(
+            [np.full((pad, values.shape[1]), np.nan, dtype=np.float32), values])
+        present = np.concatenate([np.zeros(pad, dtype=bool), grid.present])
+        offsets = np.arange(self.length)
+        windows = np.ascontiguousarray(
+            values[slots[:, np.newaxis] + offsets].transpose(0, 2, 1), dtype=np.float32)
+        return times, windows, present[slots[:, np.newaxis] + offsets]
+
+    def transform(self, windows, present=None):
+        """
+        Calculates the model's features for a batch of windows.
+
+        Parameters
+        ----------
+        windows: numpy.ndarray
+            (batch x needed_columns x length) float32 windows, oldest slot
+            first, with NaN for missing values
+        present: numpy.ndarray, optional
+            (batch x length) bool, True for the slots that hold a sample.
+            By default a slot is present if any of its values is not NaN
+
+        Returns
+        -------
+        numpy.ndarray
+            (batch x features) contiguous float32 matrix, in self.features order
+        """
+        windows = np.asarray(windows, dtype=np.float32)
+        if present is None:
+            present = ~np.isnan(windows).all(axis=1)
+        features = np.empty((len(windows), len(self.features)), dtype=np.float32)
+
+        if self._compiled is not None:
+            features[:, self._expert_out] = wt.compute_features(
+                windows[:, self._expert_in, -1], self._compiled)
+        features[:, self._direct_out] = windows[:, self._direct_field, self._direct_slot]
+
+        for window in self._windows:
+            values = windows[:, window['fields'], -window['slots']:].astype(np.float64)
+            valid = ~np.isnan(values)
+            count = valid.sum(axis=2)
+            with np.errstate(all='ignore'):
+                mean = np.where(valid, values, 0).sum(axis=2) / count
+                deviation = np.where(valid, values - mean[:, :, np.newaxis], 0)
+                std = np.sqrt((deviation * deviation).sum(axis=2) / (count - 1))
+            std[count < 2] = np.nan
+            mean[~present[:, -window['slots']:].all(axis=1)] = np.nan
+            for i, field in window['std']:
+                features[:, i] = std[:, field]
+            for i, field in window['mean']:
+                features[:, i] = mean[:, field]
+        return features
+
+    def score(self, windows, present=None):
+        """
+        Predicts the labels of a batch of windows, and records the latency.
+
+        Parameters
+        ----------
+        windows, present:
+            As in transform()
+
+        Returns
+        -------
+        numpy.ndarray
+            The predicted label of each window, or NaN where the scored time
+            has no sample or a feature is NaN
+        """
+        start_time = time.perf_counter()
+        windows = np.asarray(windows, dtype=np.float32)
+        if present is None:
+            present = ~np.isnan(windows).all(axis=1)
+        features = self.transform(windows, present)
+        valid = present[:, -1] & ~np.isnan(features).any(axis=1)
+
+        predictions = np.full(len(features), np.nan)
+        if valid.any():
+            features = features[valid]
+            if self.scaler is not None:
+                features = self.scaler.transform(features)
+            predictions[valid] = self.model.predict(features)
+        self.latencies.append((len(windows), time.perf_counter() - start_time))
+        return predictions
+
+    def score_frame(self, scada_data, times=None):
+        """
+        Scores cleaned SCADA data of one turbine
+
+        Returns
+        -------
+        pandas.Series
+            The predicted labels, indexed by time
+        """
+        times, windows, present = self.prepare(scada_data, times)
+        return pd.Series(self.score(windows, present), index=times)
+
+    def latency_summary(self):
+        """
+        Returns the number of batches and rows scored, and the mean, median,
+        95th percentile and maximum batch latency in milliseconds, over the
+        last latency_history batches
+        """
+        if not self.latencies:
+            return {'batches': 0, 'rows': 0}
+        rows, seconds = np.array(self.latencies).T
+        milliseconds = seconds * 1000
+        return {'batches': len(milliseconds), 'rows': int(rows.sum()),
+                'mean_ms': float(milliseconds.mean()),
+                'p50_ms': float(np.percentile(milliseconds, 50)),
+                'p95_ms': float(np.percentile(milliseconds, 95)),
+                'max_ms': float(milliseconds.max())}
+
+    def save(self, filename):
+        """
+        Pickles the scorer, with its model and scaler
+        """
+        with open(filename, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(filename):
+        """
+        Loads a scorer saved with save()
+        """
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+
+
+class FarmBuffer(object):
+    """
+    The latest window of every turbine of a farm, scored one 10 minute tick
+    at a time.
+
+    Each tick shifts the windows of all turbines by the time since the last
+    tick, writes the new rows into the last slot and scores all turbines as
+    one batch.
+
+    Parameters
+    ----------
+    scorer: FaultScorer
+        The fitted scorer
+    turbines: sequence
+        The turbine names
+    """
+
+    def __init__(self, scorer, turbines):
+        self.scorer = scorer
+        self.turbines = pd.Index(turbines)
+        self.windows = np.full(
+            (len(self.turbines), len(scorer.needed_columns), scorer.length), np.nan,
+            dtype=np.float32)
+        self.present = np.zeros((len(self.turbines), scorer.length), dtype=bool)
+        self.time = None
+
+    def update(self, time, records):
+        """
+        Adds the rows of one tick and scores every turbine.
+
+        Parameters
+        ----------
+        time: pandas.Timestamp
+            The (already shifted) time of the rows, on the 10 minute grid
+        records: pandas.DataFrame
+            The SCADA rows of the tick, indexed by turbine. Turbines without
+            a row have no sample at this time
+
+        Returns
+        -------
+        pandas.Series
+            The predicted label of each turbine, NaN if it cannot be scored
+        """
+        time = pd.Timestamp(time)
+        if self.time is not None:
+            shift, remainder = divmod(time - self.time, self.scorer.sample_period)
+            if remainder != pd.Timedelta(0) or shift < 1:
+                raise ValueError("%s is not a later tick than %s" % (time, self.time))
+            shift = min(shift, self.scorer.length)
+            self.windows[:, :, :-shift] = self.windows[:, :, shift:]
+            self.windows[:, :, -shift:] = np.nan
+            self.present[:, :-shift] = self.present[:, shift:]
+            self.present[:, -shift:] = False
+        self.time = time
+
+        if 'Inverter_averages' not in records.columns:
+            inverters = records.reindex(columns=wt.INVERTERS)
+            records = records.assign(Inverter_averages=inverters.mean(axis=1),
+                                     Inverter_std_dev=inverters.std(axis=1))
+        rows = self.turbines.get_indexer(records.index)
+        if np.any(rows < 0):
+            raise KeyError("Unknown turbines %s" % list(records.index[rows < 0]))
+        self.windows[rows, :, -1] = records.reindex(
+            columns=self.scorer.needed_columns).to_numpy(dtype=np.float32)
+        self.present[rows, -1] = True
+        return pd.Series(self.scorer.score(self.windows, self.present), index=self.turbines,
+                         name=time)
@@ -0,0 +1,166 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import WindTurbine_cache as wtc
+
+STORE_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+
+class FeatureStore(object):
+    """
+    A directory of time-indexed tables, partitioned by month.
+
+    Each month of a table is saved with WindTurbine_cache.write_frame, as one
+    memory-mappable .npy file per column, and a manifest per table records
+    the partitions, the columns and the pipeline parameters the table was
+    made with. Reads only open the months overlapping the requested time
+    range and the requested columns, so loading a few features for one CV
+    fold does not touch the rest of the data.
+
+    Parameters
+    ----------
+    root: str
+        The store directory. It is created when a table is first written
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _table_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def tables(self):
+        """
+        Returns the names of the tables in the store
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if not name.startswith('.')
+                      and os.path.isfile(os.path.join(self.root, name, MANIFEST)))
+
+    def manifest(self, name):
+        """
+        Returns the manifest of a table: its columns, partitions and parameters
+        """
+        filename = os.path.join(self._table_dir(name), MANIFEST)
+        try:
+            with open(filename) as f:
+                manifest = json.load(f)
+        except (IOError, OSError):
+            raise KeyError("No table %s in %s" % (name, self.root))
+        if manifest.get('version') != STORE_VERSION:
+            raise IOError("Table %s in %s has an unsupported version" % (name, self.root))
+        return manifest
+
+    def write(self, name, data, params=None):
+        """
+        Writes a table, replacing any table with the same name.
+
+        The table is written to a temporary directory, with the manifest
+        last, and then moved into place, so a crash part way leaves the old
+        table as it was.
+
+        Parameters
+        ----------
+        name: str
+            The table name, e.g. 'derived_features'
+        data: pandas.DataFrame or pandas.Series
+            The data, indexed by time. A Series is saved as a one-column table
+        params: dict, optional
+            The json-serialisable pipeline parameters the data was made with,
+            e.g. the number of lags or the window length
+        """
+        if isinstance(data, pd.Series):
+            data = data.to_frame(data.name if data.name is not None else name)
+        if not isinstance(data.index, pd.DatetimeIndex):
+            raise ValueError("Table %s must be indexed by time" % name)
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index(kind='stable')
+
+        table_dir = self._table_dir(name)
+        temp_dir = self._table_dir('.%s.tmp' % name)
+        old_dir = self._table_dir('.%s.old' % name)
+        for directory in (temp_dir, old_dir):
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+        os.makedirs(temp_dir)
+
+        months = data.index.year * 100 + data.index.month
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        ends = np.append(starts[1:], len(data))
+        partitions = []
+        for start, end in zip(starts, ends):
+            key = '%04d-%02d' % divmod(months[start], 100)
+            wtc.write_frame(data.iloc[start:end], os.path.join(temp_dir, key))
+            partitions.append({'key': key, 'rows': int(end - start),
+                               'start': data.index[start].isoformat(),
+                               'end': data.index[end - 1].isoformat()})
+
+        manifest = {'version': STORE_VERSION, 'index': data.index.name,
+                    'columns': [str(column) for column in data.columns],
+                    'dtypes': [dtype.str for dtype in data.dtypes],
+                    'rows': len(data), 'partitions': partitions, 'params': params or {}}
+        wtc._write_manifest(manifest, temp_dir)
+
+        if os.path.isdir(table_dir):
+            os.rename(table_dir, old_dir)
+        os.rename(temp_dir, table_dir)
+        if os.path.isdir(old_dir):
+            shutil.rmtree(old_dir)
+
+    def read(self, name, start=None, end=None, columns=None, mmap=True):
+        """
+        Reads part of a table.
+
+        Parameters
+        ----------
+        name: str
+            The table name
+        start: str or pandas.Timestamp, optional
+            The first time to read (included)
+        end: str or pandas.Timestamp, optional
+            The last time to read (included)
+        columns: sequence of str, optional
+            The columns to read. All columns by default
+        mmap: bool, optional
+            Memory-map the column files. If the rows come from a single month
+            the returned data stays backed by the files
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        manifest = self.manifest(name)
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+
+        frames = []
+        for partition in manifest['partitions']:
+            if start is not None and pd.Timestamp(partition['end']) < start:
+                continue
+            if end is not None and pd.Timestamp(partition['start']) > end:
+                continue
+            frame = wtc.read_frame(os.path.join(self._table_dir(name), partition['key']),
+                                   columns=columns, mmap=mmap)
+            first = 0 if start is None else frame.index.searchsorted(start, side='left')
+            last = len(frame) if end is None else frame.index.searchsorted(end, side='right')
+            frames.append(frame.iloc[first:last])
+
+        if not frames:
+            names = manifest['columns'] if columns is None else list(columns)
+            return pd.DataFrame(columns=names, index=pd.DatetimeIndex([], name=manifest['index']))
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames)
+
+    def params(self, name):
+        """
+        Returns the pipeline parameters a table was written with
+        """
+        return self.manifest(name)['params']
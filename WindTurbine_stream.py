@@ -0,0 +1,421 @@
+import argparse
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import WindTurbine as wt
+
+EPS = np.finfo(np.float64).eps
+
+
+class StreamingFeatures(object):
+    """
+    Calculates the derived features one SCADA record at a time.
+
+    Produces the same feature row as the batch pipeline (create_new_features,
+    create_lagged_features and create_mean_std_features, joined like
+    derived_features) without rerunning it over the whole history. Only the
+    last few samples are kept, in a ring buffer, and the window sums for the
+    mean and standard deviation are updated as samples enter and leave the
+    windows, so each record costs O(columns). The sums are of the samples
+    minus a per-column shift close to their level, reset from the buffer
+    at every resync, so the variance does not lose precision on large
+    values such as the power. A bound on the rounding error of the sums is
+    kept with them, and a window whose variance is within it is recalculated
+    from the buffer, so a constant window has a standard deviation of 0 as
+    in the batch features.
+
+    Records are cleaned like clean_data(): records off the sample_period dot are
+    dropped, a record with the same time as the previous one is averaged
+    with it, and records older than the latest one are ignored.
+
+    Parameters
+    ----------
+    columns: sequence of str
+        The cleaned SCADA fields, in order, e.g. edata.scada_data.columns
+        after clean_data()
+    n_lags: int, optional
+        The number of lags, as in create_lagged_features(n_lags)
+    windows: str, pandas.Timedelta or sequence of these, optional
+        The window lengths, as in create_mean_std_features(windows)
+    sample_period: pandas.Timedelta, optional
+        The time between samples
+    resync: int, optional
+        The window sums are recalculated from the buffer every resync
+        records, so rounding errors do not build up
+    """
+
+    def __init__(self, columns, n_lags=6, windows='2hr', sample_period=wt.SAMPLE_PERIOD,
+                 resync=1000):
+        self.columns = list(columns)
+        self.n_lags = n_lags
+        self.windows = wt.window_list(windows)
+        self.sample_period = pd.Timedelta(sample_period)
+        self.resync = resync
+
+        # The number of slots in each window, including the current one
+        self._window_slots = [window // self.sample_period + 1 for window in self.windows]
+        self._length = max([n_lags + 1] + self._window_slots)
+
+        self._compiled = wt.compile_feature_spec(wt.EXPERT_FEATURES, self.columns)
+        self._sources = pd.Index(self.columns).get_indexer(self._compiled['source_columns'])
+
+        self.feature_names = list(self._compiled['names'])
+        self.feature_names += [wt.lag_column_name(column, lag, self.sample_period)
+                               for lag in range(1, n_lags + 1) for column in self.columns]
+        for window in self.windows:
+            label = wt.window_label(window)
+            self.feature_names += [label + '_std_' + str(column) for column in self.columns]
+            self.feature_names += [label + '_mean_' + str(column) for column in self.columns]
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all the records seen so far
+        """
+        n_columns = len(self.columns)
+        self._values = np.full((self._length, n_columns), np.nan)
+        self._present = np.zeros(self._length, dtype=bool)
+        self._base = None
+        self._last_slot = None
+        self._updates = 0
+        # Running sums of the samples in each window, minus self._shift
+        self._shift = np.zeros(n_columns)
+        self._rows = np.zeros(len(self.windows), dtype=np.int64)
+        self._count = np.zeros((len(self.windows), n_columns))
+        self._sum = np.zeros((len(self.windows), n_columns))
+        self._sum_sq = np.zeros((len(self.windows), n_columns))
+        # Bounds on the rounding errors of self._sum and self._sum_sq
+        self._sum_error = np.zeros((len(self.windows), n_columns))
+        self._sum_sq_error = np.zeros((len(self.windows), n_columns))
+        # The records averaged into the latest slot
+        self._dupe_count = np.zeros(n_columns)
+        self._dupe_sum = np.zeros(n_columns)
+
+    def _record_values(self, records):
+        """
+        Returns records (a DataFrame) as a float64 matrix in self.columns
+        order, with Inverter_averages and Inverter_std_dev added if missing
+        """
+        if 'Inverter_averages' not in records.columns:
+            inverters = records.reindex(columns=wt.INVERTERS)
+            records = records.assign(Inverter_averages=inverters.mean(axis=1),
+                                     Inverter_std_dev=inverters.std(axis=1))
+        return records.reindex(columns=self.columns).to_numpy(dtype=np.float64)
+
+    def _shifted(self, position):
+        """
+        Returns the values of a buffer position minus the shift, 0 where
+        NaN, and where they are not NaN
+        """
+        values = self._values[position]
+        valid = ~np.isnan(values)
+        return np.where(valid, values - self._shift, 0), valid
+
+    def _add(self, slot, sign):
+        """
+        Adds (sign=1) or removes (sign=-1) a slot from the window sums
+        """
+        if not self._present[slot % self._length]:
+            return
+        values, valid = self._shifted(slot % self._length)
+        for w, n_slots in enumerate(self._window_slots):
+            if slot > self._last_slot - n_slots:
+                self._rows[w] += sign
+                self._count[w] += sign * valid
+                self._sum[w] += sign * values
+                self._sum_sq[w] += sign * values * values
+                self._add_rounding(w)
+
+    def _add_rounding(self, w):
+        """
+        Adds the rounding error of the latest change to the sums of window w
+        """
+        self._sum_error[w] += EPS * np.abs(self._sum[w])
+        self._sum_sq_error[w] += 2 * EPS * np.abs(self._sum_sq[w])
+
+    def _advance(self, slot):
+        """
+        Moves the latest slot forward to slot, dropping samples that leave
+        the windows and clearing the skipped slots
+        """
+        if slot - self._last_slot >= self._length:
+            self._values[:] = np.nan
+            self._present[:] = False
+            self._rows[:] = 0
+            self._count[:] = 0
+            self._sum[:] = 0
+            self._sum_sq[:] = 0
+            self._sum_error[:] = 0
+            self._sum_sq_error[:] = 0
+        else:
+            for new_slot in range(self._last_slot + 1, slot + 1):
+                for w, n_slots in enumerate(self._window_slots):
+                    old_slot = new_slot - n_slots
+                    position = old_slot % self._length
+                    if old_slot >= 0 and self._present[position]:
+                        values, valid = self._shifted(position)
+                        self._rows[w] -= 1
+                        self._count[w] -= valid
+                        self._sum[w] -= values
+                        self._sum_sq[w] -= values * values
+                        self._add_rounding(w)
+                self._values[new_slot % self._length] = np.nan
+                self._present[new_slot % self._length] = False
+        self._last_slot = slot
+        self._dupe_count[:] = 0
+        self._dupe_sum[:] = 0
+
+    def _resync(self):
+        """
+        Moves the shift to the mean of the buffer and recalculates the window
+        sums from the buffer
+        """
+        with np.errstate(all='ignore'):
+            mean = np.nanmean(self._values[self._present], axis=0)
+        self._shift = np.where(np.isnan(mean), self._shift, mean)
+        self._rows[:] = 0
+        self._count[:] = 0
+        self._sum[:] = 0
+        self._sum_sq[:] = 0
+        self._sum_error[:] = 0
+        self._sum_sq_error[:] = 0
+        for slot in range(self._last_slot - self._length + 1, self._last_slot + 1):
+            if slot >= 0:
+                self._add(slot, 1)
+
+    def update(self, time, record):
+        """
+        Adds one SCADA record and returns its feature row.
+
+        Parameters
+        ----------
+        time: pandas.Timestamp
+            The (already shifted) time of the record, as in scada_data.index
+        record: dict or pandas.Series
+            The SCADA fields of the record. Fields not in self.columns are
+            ignored
+
+        Returns
+        -------
+        pandas.Series or None
+            The features of the latest time, named like derived_features,
+            or None if the record was dropped or not all n_lags previous
+            samples exist
+        """
+        values = self._record_values(pd.DataFrame([record], dtype=np.float64))[0]
+        features = self._update(pd.Timestamp(time), values)
+        if features is None:
+            return None
+        return pd.Series(features, index=self.feature_names, name=pd.Timestamp(time))
+
+    def update_many(self, records):
+        """
+        Adds a batch of SCADA records, in time order.
+
+        Parameters
+        ----------
+        records: pandas.DataFrame
+            SCADA records indexed by time
+
+        Returns
+        -------
+        pandas.DataFrame
+            The feature rows of the records that produced one. A repeated
+            time gives a row for each record, so only the last is kept
+        """
+        values = self._record_values(records)
+        times, rows = [], []
+        for time, record in zip(records.index, values):
+            features = self._update(time, record)
+            if features is not None:
+                times.append(time)
+                rows.append(features)
+
+        features = pd.DataFrame(
+            np.array(rows, dtype=np.float32).reshape(len(rows), len(self.feature_names)),
+            index=pd.DatetimeIndex(times, name=records.index.name),
+            columns=self.feature_names)
+        return features[~features.index.duplicated(keep='last')]
+
+    def _update(self, time, values):
+        """
+        Adds one record, as an array in self.columns order, and returns its
+        feature array or None
+        """
+        if (time - time.normalize()) % self.sample_period != pd.Timedelta(0):
+            return None
+        if self._base is None:
+            self._base = time
+            self._last_slot = 0
+            self._shift = np.where(np.isnan(values), 0, values)
+        slot, remainder = divmod(time - self._base, self.sample_period)
+        if remainder != pd.Timedelta(0) or slot < self._last_slot:
+            return None
+
+        if slot > self._last_slot or not self._present[slot % self._length]:
+            self._advance(slot)
+        else:
+            # A repeated time is replaced by the mean of its records
+            self._add(slot, -1)
+
+        valid = ~np.isnan(values)
+        self._dupe_count += valid
+        self._dupe_sum += np.where(valid, values, 0)
+        with np.errstate(all='ignore'):
+            self._values[slot % self._length] = self._dupe_sum / self._dupe_count
+        self._present[slot % self._length] = True
+        self._add(slot, 1)
+
+        self._updates += 1
+        if self.resync and self._updates % self.resync == 0:
+            self._resync()
+        return self._features(slot)
+
+    def _features(self, slot):
+        """
+        Returns the feature array of the latest slot, or None if a lag is missing
+        """
+        lag_slots = slot - np.arange(1, self.n_lags + 1)
+        if np.any(lag_slots < 0) or not self._present[lag_slots % self._length].all():
+            return None
+
+        current = self._values[slot % self._length]
+        parts = [wt.compute_features(
+            current[self._sources][np.newaxis].astype(np.float32), self._compiled)[0]]
+        parts.append(self._values[lag_slots % self._length].ravel())
+
+        with np.errstate(all='ignore'):
+            for w, n_slots in enumerate(self._window_slots):
+                count = self._count[w]
+                shifted_mean = self._sum[w] / count
+                var = (self._sum_sq[w] - self._sum[w] * shifted_mean) / (count - 1)
+                rounding = self._sum_sq_error[w] + 2 * np.abs(shifted_mean) * self._sum_error[w]
+                redo = np.flatnonzero((count >= 2) & ~(var * (count - 1) > rounding))
+                if len(redo):
+                    window = self._values[(slot - np.arange(n_slots)) % self._length]
+                    var[redo] = wt.window_var(window, np.array([0]), np.array([n_slots]),
+                                              np.zeros(len(redo), dtype=np.int64), redo)
+                var[count < 2] = np.nan
+                mean = shifted_mean + self._shift
+                mean[count == 0] = np.nan
+                if self._rows[w] != n_slots:
+                    mean[:] = np.nan
+                parts.append(np.sqrt(np.maximum(var, 0)))
+                parts.append(mean)
+
+        return np.concatenate(parts).astype(np.float32)
+
+
+def compare_with_batch(scada_data, n_lags=6, windows='2hr'):
+    """
+    Runs the batch and the streaming feature calculations over the same
+    cleaned SCADA data and compares them.
+
+    Parameters
+    ----------
+    scada_data: pandas.DataFrame
+        Cleaned SCADA data, e.g. edata.scada_data after clean_data()
+    n_lags: int, optional
+        The number of lags
+    windows: str, pandas.Timedelta or sequence of these, optional
+        The window lengths
+
+    Returns
+    -------
+    dict
+        'same_index' and 'same_columns' are True if both produced the same
+        rows and columns, 'max_abs_diff' and 'max_rel_diff' are the largest
+        differences between their values (NaN in the same places counts as
+        equal), the latter relative to max(|value|, 1), 'max_scaled_diff' is
+        the largest difference relative to the largest |value| of its column
+        (at least 1) and 'nan_mismatches' is the number of values that are
+        NaN in one but not the other
+    """
+    batch = wt.EnerconWindTurbineData()
+    batch.scada_data = scada_data
+    batch.create_new_features()
+    batch.create_lagged_features(n_lags)
+    batch.create_mean_std_features(windows)
+    expected = pd.concat([batch.new_features, batch.lagged_features, batch.mean_std],
+                         axis=1, join='inner')
+
+    stream = StreamingFeatures(scada_data.columns, n_lags, windows)
+    actual = stream.update_many(scada_data)
+
+    result = {'same_index': expected.index.equals(actual.index),
+              'same_columns': list(expected.columns) == list(actual.columns)}
+    expected = expected.reindex(index=actual.index, columns=actual.columns).to_numpy(np.float64)
+    actual = actual.to_numpy(np.float64)
+    both = ~np.isnan(expected) & ~np.isnan(actual)
+    difference = np.abs(expected - actual)[both]
+    scale = np.maximum(np.abs(expected[both]), 1)
+    with np.errstate(all='ignore'):
+        column_scale = np.maximum(np.nanmax(np.abs(expected), axis=0, initial=0), 1)
+    column_scale = np.broadcast_to(column_scale, expected.shape)[both]
+    result['max_abs_diff'] = difference.max() if difference.size else 0.0
+    result['max_rel_diff'] = (difference / scale).max() if difference.size else 0.0
+    result['max_scaled_diff'] = (difference / column_scale).max() if difference.size else 0.0
+    result['nan_mismatches'] = int((np.isnan(expected) != np.isnan(actual)).sum())
+    return result
+
+
+def check_parity(scada_data, n_lags=6, windows='2hr', tolerance=1e-5):
+    """
+    Raises AssertionError unless the streaming features match the batch
+    ones: the same rows and columns, NaN in the same places, and values
+    within tolerance of each other, relative to the largest |value| of
+    their column. A standard deviation close to 0 is the square root of a
+    rounding error in the batch sums, so it is compared to the scale of
+    its column rather than to itself
+
+    Returns
+    -------
+    dict
+        The compare_with_batch() result
+    """
+    result = compare_with_batch(scada_data, n_lags, windows)
+    assert result['same_index'], "The streaming features have different rows"
+    assert result['same_columns'], "The streaming features have different columns"
+    assert result['nan_mismatches'] == 0, \
+        "%d values are NaN in only one of the results" % result['nan_mismatches']
+    assert result['max_scaled_diff'] <= tolerance, \
+        "The largest difference is %g, more than %g" % (result['max_scaled_diff'], tolerance)
+    return result
+
+
+def main(argv=None):
+    import WindTurbine_synthetic as syn
+
+    parser = argparse.ArgumentParser(
+        description='Check that the streaming features match the batch pipeline')
+    parser.add_argument('--months', type=float, default=2,
+                        help='the length of the synthetic data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', help='where to write the synthetic data')
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    args = parser.parse_args(argv)
+
+    files = syn.generate_turbine(args.data_dir or tempfile.mkdtemp(prefix='windturbine_stream_'),
+                                 months=args.months, seed=args.seed)
+    edata = wt.EnerconWindTurbineData(**files)
+    edata.import_data(n_jobs=1)
+    edata.clean_data()
+
+    failed = False
+    for n_lags, windows in ((6, '2hr'), (3, ('1hr', '2hr', '6hr'))):
+        try:
+            result = check_parity(edata.scada_data, n_lags, windows, args.tolerance)
+            print("n_lags=%d windows=%s: max scaled difference %.3g" % (
+                n_lags, windows, result['max_scaled_diff']))
+        except AssertionError as error:
+            print("PARITY FAILED n_lags=%d windows=%s: %s" % (n_lags, windows, error))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import WindTurbine as wt
+
+# The 62 SCADA fields, named as import_data names them. The pipeline reads
+# all but the last 4, which only fill out the schema
+SCADA_FIELDS = [
+    'WEC_ava_windspeed', 'WEC__max_windspeed', 'WEC__min_windspeed',
+    'WEC_ava_Rotation', 'WEC_max_Rotation', 'WEC_min_Rotation',
+    'WEC_ava_Power', 'WEC_max_Power', 'WEC_min_Power',
+    'WEC_ava_reactive_Power', 'WEC_max_reactive_Power', 'WEC_min_reactive_Power',
+    'WEC_ava_available_P_from_wind', 'WEC_ava_available_P_technical_reasons',
+    'WEC_ava_Available_P_force_majeure_reasons', 'WEC_ava_Available_P_force_external_reasons',
+    'WEC_Production_kWh', 'WEC_Production_minutes', 'WEC_Operating_Hours', 'Error',
+    'CS101__Ambient_temp', 'CS101__Tower_temp', 'CS101__Control_cabinet_temp',
+    'CS101__Transformer_temp', 'CS101__Nacelle_temp', 'CS101__Nacelle_cabinet_temp',
+    'CS101__Nacelle_ambient_temp_1', 'CS101__Nacelle_ambient_temp_2',
+    'CS101__Main_carrier_temp', 'CS101__Front_bearing_temp', 'CS101__Rear_bearing_temp',
+    'CS101__Rectifier_cabinet_temp', 'CS101__Yaw_inverter_cabinet_temp',
+    'CS101__Fan_inverter_cabinet_temp',
+    'CS101__Stator_temp_1', 'CS101__Stator_temp_2', 'CS101__Rotor_temp_1', 'CS101__Rotor_temp_2',
+    'CS101__Blade_A_temp', 'CS101__Blade_B_temp', 'CS101__Blade_C_temp',
+    'CS101__Pitch_cabinet_blade_A_temp', 'CS101__Pitch_cabinet_blade_B_temp',
+    'CS101__Pitch_cabinet_blade_C_temp'] + wt.INVERTERS + [
+    'CS101__Sys_2_inverter_5_cabinet_temp', 'CS101__Sys_2_inverter_6_cabinet_temp',
+    'CS101__Sys_2_inverter_7_cabinet_temp',
+    'CS101__Spinner_temp', 'WEC_ava_blade_angle_A',
+    'WEC_ava_Nacelle_position_including_cable_twisting', 'RTU_ava_Setpoint_1']
+
+STATUS_HEADER = ['Time', 'Main Status', 'Sub Status', 'Full Status', 'Status Text', 'T',
+                 'Service', 'FaultMsg', 'Value0']
+WARNING_HEADER = ['Time', 'Main Status', 'Sub Status', 'Full Status', 'Status Text',
+                  'Service', 'Value0']
+
+# The status of a turbine in operation, and when there is too little wind
+OPERATING_STATUS = 0
+LOW_WIND_STATUS = 2
+# Warning codes drawn at random (arbitrary, not real Enercon codes)
+WEC_WARNINGS = (10, 103, 221, 222, 230)
+RTU_WARNINGS = (49, 50)
+RTU_STATUSES = (0, 21)
+
+# The file written for each EnerconWindTurbineData argument
+FILE_NAMES = {
+    'scada_data_file': 'SCADA_data.csv',
+    'status_data_wec_file': 'status_data_wec.csv',
+    'status_data_rtu_file': 'status_data_rtu.csv',
+    'warning_data_wec_file': 'warning_data_wec.csv',
+    'warning_data_rtu_file': 'warning_data_rtu.csv'}
+
+RATED_POWER = 2300.0
+TIME_FORMAT = '%d/%m/%Y %H:%M:%S'
+
+
+def raw_header(name):
+    """
+    Returns a csv header that import_data turns back into name,
+    e.g. 'CS101 : Front bearing temp.' for 'CS101__Front_bearing_temp'
+    """
+    if name.startswith('CS101__'):
+        return 'CS101 : ' + name[7:].replace('_', ' ') + '.'
+    if name.startswith('WEC__'):
+        return 'WEC : ' + name[5:].replace('_', ' ')
+    prefix, _, rest = name.partition('_')
+    if prefix in ('WEC', 'RTU') and rest:
+        words = rest.split('_')
+        if words[0] in ('ava', 'max', 'min'):
+            words[0] += '.'
+        return prefix + ': ' + ' '.join(words)
+    return name.replace('_', ' ')
+
+
+def _smooth_noise(rng, n, length):
+    """
+    Returns n samples of unit variance noise, correlated over about length samples
+    """
+    kernel = np.exp(-np.arange(4 * length) / float(length))
+    noise = np.convolve(rng.standard_normal(n + len(kernel)), kernel, mode='valid')[:n]
+    return noise / np.sqrt((kernel * kernel).sum())
+
+
+def _episodes(rng, n, rate, mean_length, min_length=1):
+    """
+    Returns (start, end) slots of random episodes, rate per slot on average,
+    with exponential lengths
+    """
+    starts = np.sort(rng.choice(n, min(rng.poisson(rate * n), n), replace=False))
+    lengths = np.maximum(rng.exponential(mean_length, len(starts)).astype(int), min_length)
+    return starts, np.minimum(starts + lengths, n)
+
+
+def _scada_values(rng, times, faults):
+    """
+    Returns the (times x SCADA_FIELDS) values of a turbine with the given
+    (start, end, code) fault episodes
+    """
+    n = len(times)
+    day = 2 * np.pi * (times.hour * 60 + times.minute).to_numpy() / 1440.0
+    year = 2 * np.pi * times.dayofyear.to_numpy() / 365.25
+
+    windspeed = np.clip(7 + 3.5 * _smooth_noise(rng, n, 36) + np.sin(day), 0, 30)
+    load = np.clip((windspeed - 3) / 9.0, 0, 1) ** 3
+    load[windspeed > 25] = 0
+
+    in_fault = np.zeros(n, dtype=bool)
+    heating = np.zeros(n)
+    for start, end, code in faults:
+        in_fault[start:end] = True
+        # Generator heating faults are preceded by a temperature rise
+        if code == 9:
+            ramp = max(start - 36, 0)
+            heating[ramp:start] = np.linspace(0, 25, start - ramp)
+            heating[start:end] = 25
+    available = RATED_POWER * load
+    power = np.where(in_fault, 0, available)
+    rotation = np.where(in_fault | (windspeed < 3), 0, 6 + 12 * np.clip((windspeed - 3) / 9.0, 0, 1))
+
+    ambient = 10 + 8 * np.sin(year) + 4 * np.sin(day - 2) + 0.5 * _smooth_noise(rng, n, 12)
+    nacelle = ambient + 8 + 10 * power / RATED_POWER
+
+    def noise(scale=0.5):
+        return scale * rng.standard_normal(n)
+
+    values = {
+        'WEC_ava_windspeed': windspeed,
+        'WEC__max_windspeed': windspeed * (1.3 + 0.1 * np.abs(noise())),
+        'WEC__min_windspeed': windspeed * (0.7 - 0.1 * np.abs(noise())),
+        'WEC_ava_Rotation': rotation,
+        'WEC_max_Rotation': rotation * 1.1 + np.abs(noise(0.2)),
+        'WEC_min_Rotation': np.maximum(rotation * 0.9 - np.abs(noise(0.2)), 0),
+        'WEC_ava_Power': power,
+        'WEC_max_Power': np.minimum(power * 1.2 + np.abs(noise(20)), RATED_POWER * 1.05),
+        'WEC_min_Power': np.maximum(power * 0.8 - np.abs(noise(20)), 0),
+        'WEC_ava_reactive_Power': 0.05 * power + noise(5),
+        'WEC_max_reactive_Power': 0.08 * power + np.abs(noise(5)),
+        'WEC_min_reactive_Power': 0.02 * power - np.abs(noise(5)),
+        'WEC_ava_available_P_from_wind': available,
+        'WEC_ava_available_P_technical_reasons': np.where(in_fault, available, 0),
+        'WEC_ava_Available_P_force_majeure_reasons': np.zeros(n),
+        'WEC_ava_Available_P_force_external_reasons': np.zeros(n),
+        'WEC_Production_kWh': np.cumsum(power / 6.0),
+        'WEC_Production_minutes': np.cumsum(np.where(power > 0, 10, 0)),
+        'WEC_Operating_Hours': np.arange(1, n + 1) / 6.0,
+        'Error': in_fault.astype(float),
+        'CS101__Ambient_temp': ambient,
+        'CS101__Tower_temp': ambient + 3 + noise(),
+        'CS101__Control_cabinet_temp': ambient + 12 + noise(),
+        'CS101__Transformer_temp': ambient + 20 + 25 * power / RATED_POWER + noise(),
+        'CS101__Nacelle_temp': nacelle,
+        'CS101__Nacelle_cabinet_temp': nacelle + 5 + noise(),
+        'CS101__Nacelle_ambient_temp_1': ambient + 1 + noise(),
+        'CS101__Nacelle_ambient_temp_2': ambient + 1 + noise(),
+        'CS101__Main_carrier_temp': nacelle + 4 + noise(),
+        'CS101__Front_bearing_temp': nacelle + 10 + 10 * load + noise(),
+        'CS101__Rear_bearing_temp': nacelle + 8 + 10 * load + noise(),
+        'CS101__Rectifier_cabinet_temp': nacelle + 15 + 15 * load + noise(),
+        'CS101__Yaw_inverter_cabinet_temp': nacelle + 6 + noise(),
+        'CS101__Fan_inverter_cabinet_temp': nacelle + 10 + 5 * load + noise(),
+        'CS101__Spinner_temp': ambient + 2 + noise(),
+        'WEC_ava_blade_angle_A': np.where(windspeed > 12, (windspeed - 12) * 2.5, 1) + noise(0.2),
+        'WEC_ava_Nacelle_position_including_cable_twisting': 180 + 90 * _smooth_noise(rng, n, 72),
+        'RTU_ava_Setpoint_1': np.full(n, RATED_POWER),
+    }
+    for name in ('CS101__Stator_temp_1', 'CS101__Stator_temp_2',
+                 'CS101__Rotor_temp_1', 'CS101__Rotor_temp_2'):
+        values[name] = nacelle + 30 + 40 * load + heating + noise()
+    for name in ('CS101__Blade_A_temp', 'CS101__Blade_B_temp', 'CS101__Blade_C_temp',
+                 'CS101__Pitch_cabinet_blade_A_temp', 'CS101__Pitch_cabinet_blade_B_temp',
+                 'CS101__Pitch_cabinet_blade_C_temp'):
+        values[name] = ambient + 5 + noise()
+    inverters = wt.INVERTERS + ['CS101__Sys_2_inverter_5_cabinet_temp',
+                                'CS101__Sys_2_inverter_6_cabinet_temp',
+                                'CS101__Sys_2_inverter_7_cabinet_temp']
+    for name in inverters:
+        values[name] = nacelle + 15 + 15 * load + noise()
+    return np.column_stack([values[name] for name in SCADA_FIELDS])
+
+
+def _event_frame(rng, times, codes, header, text):
+    """
+    Returns a status or warning table for events at times with codes
+    """
+    codes = np.asarray(codes, dtype=int)
+    sub_codes = np.where(codes == 0, 0, rng.integers(1, 40, len(codes)))
+    columns = {
+        'Time': times.strftime(TIME_FORMAT),
+        'Main Status': codes,
+        'Sub Status': sub_codes,
+        'Full Status': ['%d : %d' % pair for pair in zip(codes, sub_codes)],
+        'Status Text': [text % code for code in codes],
+        'T': np.ones(len(codes), dtype=int),
+        'Service': np.zeros(len(codes), dtype=bool),
+        'FaultMsg': np.isin(codes, wt.FAULT_MAIN_STATUSES),
+        'Value0': np.round(rng.uniform(0, 10, len(codes)), 1)}
+    return pd.DataFrame(dict((name, columns[name]) for name in header))
+
+
+def generate_turbine(directory, start='2014-05-01', months=1, seed=None, gap_fraction=0.01,
+                     mean_gap_hours=6, off_grid_fraction=0.002, duplicate_fraction=0.002,
+                     faults_per_month=4, mean_fault_hours=8, warnings_per_day=5):
+    """
+    Writes synthetic SCADA, status and warning csv files of one turbine.
+
+    The files have the columns import_data expects. The SCADA data follows
+    a random wind speed through a power curve, with temperatures that track
+    the load, ambient temperature and time of day. Fault episodes stop
+    production and are written to the WEC status table as a fault status
+    followed by a return to operation.
+
+    Parameters
+    ----------
+    directory: str
+        Where to write the files. Created if missing
+    start: str, optional
+        The first time
+    months: float, optional
+        The length of the data, in 30 day months
+    seed: int, optional
+        The random seed
+    gap_fraction: float, optional
+        The fraction of the time lost in gaps with no SCADA rows
+    mean_gap_hours: float, optional
+        The mean length of a gap
+    off_grid_fraction: float, optional
+        The fraction of extra SCADA rows at times off the 10 minute grid.
+        About half are less than a minute after a grid time, e.g.
+        03:00:30, and the rest 1 to 10 minutes after
+    duplicate_fraction: float, optional
+        The fraction of extra SCADA rows repeating the time of another row
+    faults_per_month: float, optional
+        The mean number of fault episodes per month
+    mean_fault_hours: float, optional
+        The mean length of a fault episode
+    warnings_per_day: float, optional
+        The mean number of WEC warnings per day
+
+    Returns
+    -------
+    dict
+        {file key: path}, the EnerconWindTurbineData arguments
+    """
+    rng = np.random.default_rng(seed)
+    period = wt.SAMPLE_PERIOD
+    slots_per_hour = pd.Timedelta('1h') // period
+    times = pd.date_range(start, periods=int(months * 30 * 24 * slots_per_hour), freq=period)
+    n = len(times)
+
+    fault_starts, fault_ends = _episodes(
+        rng, n, faults_per_month / (30.0 * 24 * slots_per_hour),
+        mean_fault_hours * slots_per_hour)
+    fault_codes = rng.choice(wt.FAULT_MAIN_STATUSES, len(fault_starts))
+    faults = list(zip(fault_starts, fault_ends, fault_codes))
+    values = _scada_values(rng, times, faults)
+
+    # Gaps, then off-grid and duplicated rows
+    keep = np.ones(n, dtype=bool)
+    gap_starts, gap_ends = _episodes(
+        rng, n, gap_fraction / (mean_gap_hours * slots_per_hour), mean_gap_hours * slots_per_hour)
+    for gap_start, gap_end in zip(gap_starts, gap_ends):
+        keep[gap_start:gap_end] = False
+    rows = np.flatnonzero(keep)
+    off_grid = rng.choice(rows, int(off_grid_fraction * len(rows)))
+    duplicates = rng.choice(rows, int(duplicate_fraction * len(rows)))
+    # Some off-grid rows stay in the minute of their grid time, e.g. 03:00:30
+    in_minute = rng.random(len(off_grid)) < 0.5
+    offsets = np.concatenate([
+        np.zeros(len(rows), dtype='m8[s]'),
+        np.where(in_minute, rng.integers(1, 60, len(off_grid)),
+                 rng.integers(60, 600, len(off_grid))).astype('m8[s]'),
+        np.zeros(len(duplicates), dtype='m8[s]')])
+    rows = np.concatenate([rows, off_grid, duplicates])
+    order = np.argsort(times.values[rows] + offsets, kind='stable')
+    rows, offsets = rows[order], offsets[order]
+    scada = values[rows]
+    # The extra rows follow the row they copy, and get some noise
+    extra = np.r_[False, rows[1:] == rows[:-1]]
+    scada[extra] += rng.normal(0, 0.5, (extra.sum(), scada.shape[1]))
+
+    # The csv times are an hour ahead of the index import_data makes
+    shift = pd.Timedelta('1h')
+    scada_times = pd.DatetimeIndex(times.values[rows] + offsets) + shift
+    scada = pd.DataFrame(np.round(scada, 2), columns=[raw_header(name) for name in SCADA_FIELDS])
+    scada.insert(0, 'Time', scada_times.strftime(TIME_FORMAT))
+
+    # WEC statuses: low wind and fault episodes, each ended by a return to operation
+    low_wind = (values[:, SCADA_FIELDS.index('WEC_ava_windspeed')] < 3).astype(int)
+    changes = np.flatnonzero(np.diff(np.r_[0, low_wind]))
+    status_slots = np.concatenate([[0], changes, fault_starts, fault_ends[fault_ends < n]])
+    status_codes = np.concatenate([
+        [OPERATING_STATUS], np.where(low_wind[changes] == 1, LOW_WIND_STATUS, OPERATING_STATUS),
+        fault_codes, np.full((fault_ends < n).sum(), OPERATING_STATUS)])
+    # Faults take priority over the low wind statuses that overlap them
+    priority = np.concatenate([np.zeros(1 + len(changes)), np.ones(len(fault_starts)),
+                               np.ones((fault_ends < n).sum())])
+    in_fault = np.zeros(n + 1, dtype=int)
+    np.add.at(in_fault, fault_starts, 1)
+    np.add.at(in_fault, fault_ends, -1)
+    in_fault = np.cumsum(in_fault)[:n] > 0
+    status_keep = (priority == 1) | ~in_fault[status_slots]
+    status_slots, status_codes = status_slots[status_keep], status_codes[status_keep]
+    status_seconds = rng.integers(0, 600, len(status_slots)).astype('m8[s]')
+    status_seconds[status_slots == 0] = np.timedelta64(0, 's')
+    order = np.argsort(times.values[status_slots] + status_seconds, kind='stable')
+    status_times = pd.DatetimeIndex(times.values[status_slots][order] + status_seconds[order])
+    status_wec = _event_frame(rng, status_times + shift, status_codes[order], STATUS_HEADER,
+                              'Status %d')
+
+    status_rtu_slots = np.sort(rng.choice(n, max(int(months * 4), 1)))
+    status_rtu = _event_frame(
+        rng, times[status_rtu_slots] + shift, rng.choice(RTU_STATUSES, len(status_rtu_slots)),
+        STATUS_HEADER, 'RTU status %d')
+
+    # Warnings at random, and more often in the 6 hours before a fault
+    warning_slots = rng.choice(n, rng.poisson(warnings_per_day * n / (24.0 * slots_per_hour)))
+    precursors = np.concatenate([
+        rng.integers(max(fault_start - 6 * slots_per_hour, 0), fault_start + 1, 3)
+        for fault_start in fault_starts] or [np.zeros(0, dtype=int)])
+    warning_slots = np.sort(np.concatenate([warning_slots, precursors]))
+    warning_times = times[warning_slots] + pd.to_timedelta(
+        rng.integers(0, 600, len(warning_slots)), unit='s')
+    warning_wec = _event_frame(
+        rng, warning_times.sort_values() + shift, rng.choice(WEC_WARNINGS, len(warning_slots)),
+        WARNING_HEADER, 'Warning %d')
+    warning_rtu_slots = np.sort(rng.choice(n, max(int(months * 10), 1)))
+    warning_rtu = _event_frame(
+        rng, times[warning_rtu_slots] + shift, rng.choice(RTU_WARNINGS, len(warning_rtu_slots)),
+        WARNING_HEADER, 'RTU warning %d')
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    files = {}
+    for key, table in (('scada_data_file', scada), ('status_data_wec_file', status_wec),
+                       ('status_data_rtu_file', status_rtu),
+                       ('warning_data_wec_file', warning_wec),
+                       ('warning_data_rtu_file', warning_rtu)):
+        files[key] = os.path.join(directory, FILE_NAMES[key])
+        table.to_csv(files[key], index=False, encoding='latin-1')
+    return files
+
+
+def generate_fleet(directory, turbines=1, months=1, seed=None, **kwargs):
+    """
+    Writes synthetic data for several turbines, one subdirectory each, and
+    a fleet manifest for WindTurbine_fleet.load_manifest.
+
+    Parameters
+    ----------
+    directory: str
+        Where to write the data
+    turbines: int, optional
+        The number of turbines
+    months: float, optional
+        The length of the data of each turbine, in 30 day months
+    seed: int, optional
+        The random seed of the first turbine. Turbine i uses seed + i
+    **kwargs
+        Passed on to generate_turbine
+
+    Returns
+    -------
+    str
+        The manifest file
+    """
+    manifest = {}
+    for i in range(turbines):
+        name = 'T%02d' % (i + 1)
+        files = generate_turbine(os.path.join(directory, name), months=months,
+                                 seed=None if seed is None else seed + i, **kwargs)
+        manifest[name] = dict((key, os.path.relpath(path, directory))
+                              for key, path in files.items())
+    filename = os.path.join(directory, 'fleet.json')
+    with open(filename, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return filename
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic wind turbine csv files')
+    parser.add_argument('directory')
+    parser.add_argument('--turbines', type=int, default=1)
+    parser.add_argument('--months', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    print(generate_fleet(args.directory, args.turbines, args.months, args.seed))
@@ -0,0 +1,343 @@
+import itertools
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.metrics import classification_report, confusion_matrix, f1_score
+from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.model_selection import StratifiedKFold
+from sklearn.svm import SVC
+
+# The hyperparameters searched by the notebooks
+TUNED_PARAMETERS = {
+    'kernel': ['linear', 'poly', 'rbf', 'sigmoid'], 'gamma': ['auto', 1e-3, 1e-4],
+    'C': [0.01, .1, 1, 10, 100, 1000]}
+
+# The arrays a worker process has attached to, set by attach_arrays
+shared_arrays = {}
+
+
+def _whole_file(array):
+    """
+    Returns True if array is a memory-mapped .npy file, e.g. from
+    np.load(mmap_mode='r'), rather than a part of one
+    """
+    return isinstance(array, np.memmap) and array.filename is not None and \
+        array.flags.c_contiguous and \
+        array.offset + array.nbytes == os.path.getsize(array.filename)
+
+
+def publish_arrays(arrays):
+    """
+    Copies arrays into shared memory blocks. Memory-mapped files are not
+    copied: the workers map the same file.
+
+    Returns
+    -------
+    blocks: list of SharedMemory
+        The blocks, to close and unlink when the workers are done
+    spec: dict
+        {name: (block name, shape, dtype)}, or {name: (filename, offset,
+        shape, dtype)} for a file, for attach_arrays
+    """
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        if _whole_file(array):
+            spec[name] = (array.filename, array.offset, array.shape, array.dtype.str)
+            continue
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+
+def attach_arrays(spec):
+    """
+    Process pool initializer: maps the arrays published by publish_arrays
+    into shared_arrays, as {name: (block, array)}, without copying them.
+    The block of a memory-mapped file is None
+    """
+    for name, entry in spec.items():
+        if len(entry) == 4:
+            filename, offset, shape, dtype = entry
+            shared_arrays[name] = (None, np.memmap(filename, np.dtype(dtype), 'r', offset, shape))
+            continue
+        block_name, shape, dtype = entry
+        block = shared_memory.SharedMemory(name=block_name)
+        shared_arrays[name] = (block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf))
+
+
+def _kernel_args(kernel, gamma, n_features):
+    """
+    Returns the pairwise_kernels arguments that match SVC's kernel
+    """
+    if kernel == 'linear':
+        return {}
+    gamma = 1.0 / n_features if gamma == 'auto' else gamma
+    if kernel == 'rbf':
+        return {'gamma': gamma}
+    return {'gamma': gamma, 'coef0': 0.0, 'degree': 3} if kernel == 'poly' else \
+        {'gamma': gamma, 'coef0': 0.0}
+
+
+def _score_fold(kernel, gamma, C_values, train, test, gram_memory_mb, train_weights=None):
+    """
+    Fits one fold for every C of a (kernel, gamma) pair.
+
+    The Gram matrices of the fold are calculated once and shared by all the
+    C values, unless together they would take more than gram_memory_mb, when
+    SVC calculates the kernel itself.
+
+    Returns
+    -------
+    dict
+        {C: weighted f1 score on the test rows}
+    """
+    X = shared_arrays['X'][1]
+    y = shared_arrays['y'][1]
+    weights = shared_arrays['weights'][1][train] if train_weights is None else train_weights
+
+    scores = {}
+    gram_bytes = 8.0 * len(train) * (len(train) + len(test))
+    if gram_bytes <= gram_memory_mb * 2 ** 20:
+        kernel_args = _kernel_args(kernel, gamma, X.shape[1])
+        X_train = X[train]
+        gram_train = pairwise_kernels(X_train, metric=kernel, **kernel_args)
+        gram_test = pairwise_kernels(X[test], X_train, metric=kernel, **kernel_args)
+        for C in C_values:
+            model = SVC(kernel='precomputed', C=C)
+            model.fit(gram_train, y[train], sample_weight=weights)
+            scores[C] = f1_score(y[test], model.predict(gram_test), average='weighted')
+    else:
+        for C in C_values:
+            model = SVC(kernel=kernel, gamma=gamma, C=C)
+            model.fit(X[train], y[train], sample_weight=weights)
+            scores[C] = f1_score(y[test], model.predict(X[test]), average='weighted')
+    return scores
+
+
+def _candidates(tuned_parameters, n_iter, random_state):
+    """
+    Returns the parameter combinations to try, all of them or n_iter random ones
+    """
+    names = sorted(tuned_parameters)
+    candidates = [dict(zip(names, values))
+                  for values in itertools.product(*[tuned_parameters[name] for name in names])]
+    if n_iter is not None and n_iter < len(candidates):
+        chosen = np.random.RandomState(random_state).choice(len(candidates), n_iter, replace=False)
+        candidates = [candidates[i] for i in sorted(chosen)]
+    return candidates
+
+
+def parallel_search(X, y, weights, tuned_parameters=TUNED_PARAMETERS, cv=10, n_iter=None,
+                    random_state=None, max_workers=None, min_folds=3, prune_margin=0.1,
+                    gram_memory_mb=256, fold_weights=None, verbose=False):
+    """
+    Cross-validated search of SVC hyperparameters over a process pool.
+
+    X, y and the sample weights are put in shared memory once, and every
+    worker maps them instead of receiving a copy. A job is one fold of one
+    (kernel, gamma) pair: its Gram matrix is calculated once and reused for
+    all the C values. The first min_folds folds are run for every
+    combination; combinations whose mean score is more than prune_margin
+    below the best are then dropped, and only the rest run the other folds.
+
+    Parameters
+    ----------
+    X: array-like
+        (samples x features) training data. A memory-mapped float matrix,
+        e.g. from WindTurbine_cv.load_matrix, is shared with the workers
+        without being copied
+    y: array-like
+        The labels
+    weights: array-like
+        The sample weights used when fitting, unless fold_weights is given
+    tuned_parameters: dict, optional
+        {'kernel': [...], 'gamma': [...], 'C': [...]}
+    cv: int, cross-validator or iterable of (train, test), optional
+        The number of stratified folds, or the folds, e.g. a
+        WindTurbine_cv.BlockFolds
+    n_iter: int, optional
+        Try this many random combinations, like RandomizedSearchCV.
+        All combinations by default
+    random_state: int, optional
+        Seed for choosing the n_iter combinations
+    max_workers: int, optional
+        The number of worker processes. The number of CPUs by default
+    min_folds: int, optional
+        The number of folds run before combinations are pruned
+    prune_margin: float, optional
+        Combinations with a mean f1 score more than this below the best are
+        not run on the remaining folds. None disables pruning
+    gram_memory_mb: float, optional
+        The memory each worker may use for the precomputed Gram matrices of
+        a fold, 8 * train rows * (train rows + test rows) bytes. Larger
+        folds are fitted without them. 256 MB is about 5000 training rows.
+        All the workers together use up to max_workers times this
+    fold_weights: callable or sequence, optional
+        The weights of the training rows of each fold, as fold_weights(k)
+        or fold_weights[k], e.g. BlockFolds.weights for weights balanced on
+        each fold's own labels. Used instead of weights[train]
+    verbose: bool, optional
+        Print the progress
+
+    Returns
+    -------
+    dict
+        'best_params': the combination with the best mean score,
+        'results': a list of {'params', 'scores', 'mean_score', 'std_score',
+        'pruned'} dicts, and 'seconds': the wall-clock time
+    """
+    start_time = time.time()
+    if not (_whole_file(X) and X.dtype.kind == 'f'):
+        X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    weights = np.asarray(weights, dtype=np.float64)
+    if isinstance(cv, int):
+        cv = StratifiedKFold(n_splits=cv)
+    folds = list(cv.split(X, y)) if hasattr(cv, 'split') else list(cv)
+    n_folds = len(folds)
+    min_folds = min(min_folds, n_folds)
+    train_weights = [None] * n_folds
+    if fold_weights is not None:
+        for fold, (train, _) in enumerate(folds):
+            train_weights[fold] = np.asarray(
+                fold_weights(fold) if callable(fold_weights) else fold_weights[fold],
+                dtype=np.float64)
+            if len(train_weights[fold]) != len(train):
+                raise ValueError("Fold %d has %d training rows but %d weights"
+                                 % (fold, len(train), len(train_weights[fold])))
+
+    # The linear kernel ignores gamma, so its combinations share their scores
+    candidates = _candidates(tuned_parameters, n_iter, random_state)
+    def effective(params):
+        gamma = None if params['kernel'] == 'linear' else params['gamma']
+        return (params['kernel'], gamma, params['C'])
+    scores = dict((effective(params), {}) for params in candidates)
+    pruned = set()
+
+    blocks, spec = publish_arrays({'X': X, 'y': y, 'weights': weights})
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=attach_arrays,
+                                 initargs=(spec,)) as executor:
+            for fold_range in (range(min_folds), range(min_folds, n_folds)):
+                groups = {}
+                for key in scores:
+                    if key not in pruned:
+                        groups.setdefault(key[:2], []).append(key[2])
+                jobs = {}
+                for (kernel, gamma), C_values in groups.items():
+                    for fold in fold_range:
+                        train, test = folds[fold]
+                        future = executor.submit(
+                            _score_fold, kernel, 'auto' if gamma is None else gamma,
+                            C_values, train, test, gram_memory_mb, train_weights[fold])
+                        jobs[future] = (kernel, gamma, fold)
+                for future, (kernel, gamma, fold) in jobs.items():
+                    for C, score in future.result().items():
+                        scores[(kernel, gamma, C)][fold] = score
+                    if verbose:
+                        print("fold %d kernel=%s gamma=%s done (%.1fs)"
+                              % (fold, kernel, gamma, time.time() - start_time))
+
+                if prune_margin is not None and fold_range.start == 0:
+                    means = dict((key, np.mean(list(fold_scores.values())))
+                                 for key, fold_scores in scores.items())
+                    best = max(means.values())
+                    pruned = set(key for key, mean in means.items() if mean < best - prune_margin)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    results = []
+    for params in candidates:
+        key = effective(params)
+        fold_scores = np.array([scores[key][fold] for fold in sorted(scores[key])])
+        results.append({'params': params, 'scores': fold_scores,
+                        'mean_score': fold_scores.mean(), 'std_score': fold_scores.std(),
+                        'pruned': key in pruned})
+    # Pruned combinations have only been scored on the first folds
+    complete = [result for result in results if not result['pruned']]
+    best = max(complete, key=lambda result: result['mean_score'])
+    return {'best_params': best['params'], 'results': results,
+            'seconds': time.time() - start_time}
+
+
+def _report(model, X, y_true):
+    """
+    Prints the classification report, confusion matrix and specificity
+
+    Returns the normalised confusion matrix
+    """
+    y_pred = model.predict(X)
+    print(classification_report(y_true, y_pred))
+    print()
+    cm = confusion_matrix(y_true, y_pred)
+    print(cm)
+    # Also print specificity metric
+    print("Specificity:", cm[0, 0] / (cm[0, 1] + cm[0, 0]))
+    return cm.astype('float') / cm.sum(axis=1)[:, np.newaxis]
+
+
+def train_and_score(X_train, y_train, X_test, y_test, weights, output_filename=None,
+                    **kwargs):
+    """
+    Searches the SVC hyperparameters with parallel_search, refits the best
+    combination on all the training data and prints the same report as the
+    notebooks' CVTrainAndScore.
+
+    Parameters
+    ----------
+    X_train, y_train: array-like
+        The training data and labels
+    X_test, y_test: array-like
+        The test data and labels
+    weights: array-like
+        The training sample weights
+    output_filename: str, optional
+        If given, the fitted model is pickled to output_filename + 'f1.p'
+    **kwargs
+        Passed on to parallel_search
+
+    Returns
+    -------
+    model: sklearn.svm.SVC
+        The best combination, fitted on all the training data
+    search: dict
+        The parallel_search result, with the normalised confusion matrices
+        of the training and test sets added as 'train_cm' and 'test_cm'
+    """
+    print("# Tuning hyper-parameters for f1 \n")
+    search = parallel_search(X_train, y_train, weights, **kwargs)
+
+    print("\nBest parameters set found on development set: \n")
+    print(search['best_params'])
+    print("\nGrid scores on development set:\n")
+    for result in search['results']:
+        print("%0.3f (+/-%0.03f) for %r%s" % (
+            result['mean_score'], result['std_score'] * 2, result['params'],
+            ' (pruned)' if result['pruned'] else ''))
+    print("\nSearch time: %.1fs" % search['seconds'])
+
+    model = SVC(**search['best_params'])
+    model.fit(np.asarray(X_train, dtype=np.float64), np.asarray(y_train),
+              sample_weight=np.asarray(weights, dtype=np.float64))
+
+    print("\nDetailed classification report:\n")
+    print('Report on Training Set')
+    search['train_cm'] = _report(model, np.asarray(X_train, dtype=np.float64), y_train)
+    print('Report on Test Set\n')
+    search['test_cm'] = _report(model, np.asarray(X_test, dtype=np.float64), y_test)
+    print(search['best_params'])
+
+    if output_filename is not None:
+        with open(output_filename + 'f1.p', 'wb') as f:
+            pickle.dump(model, f)
+    return model, search